@@ -0,0 +1,14 @@
+import random
+from datetime import timedelta
+from src.Config.constants import BASE_DATE
+
+
+
+def random_queries(timetable, count, seed=0, first_hour=5, last_hour=23):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        start_stop, end_stop = rng.sample(timetable.stops, 2)
+        start_time = BASE_DATE + timedelta(hours=rng.randint(first_hour, last_hour), minutes=rng.randint(0, 59))
+        queries.append((start_stop, end_stop, start_time))
+    return queries
\ No newline at end of file
@@ -0,0 +1,144 @@
+import json, platform, random, time, tracemalloc
+from datetime import timedelta
+from functools import partial
+import numpy as np
+from src.Config.constants import BASE_DATE
+from src.Graph_algorithms.graph_loader import load_timetable
+from src.Graph_algorithms.dijkstra import dijkstra_min_time
+from src.Graph_algorithms.a_star import a_star_min_time, a_star_min_changes, a_star_min_changes_beam
+from src.Graph_algorithms.tabu_search import (
+    tabu_search_route, tabu_search_route_dynamic_size, tabu_search_route_aspiration_rule, tabu_search_route_with_sampling
+)
+from src.Utilities.search_stats import SearchStats
+from src.Benchmarks.searches import random_queries
+
+
+
+BENCHMARK_QUERIES = 200
+BENCHMARK_ROUTES = 10
+BENCHMARK_ROUTE_STOPS = 4
+BENCHMARK_TABU_ITERATIONS = 50
+PERCENTILES = (50, 95, 99)
+# per-run SearchStats counters summarized next to the latency
+REPORTED_COUNTERS = ('pops', 'pushes', 'max_heap', 'neighbors', 'cache_hits')
+
+
+
+def random_routes(timetable, count, stops=BENCHMARK_ROUTE_STOPS, seed=0, first_hour=5, last_hour=20):
+    # (start_stop, stops to visit, start_time) for the tabu searches
+    rng = random.Random(seed)
+    routes = []
+    for _ in range(count):
+        start_stop, *visit = rng.sample(timetable.stops, stops + 1)
+        start_time = BASE_DATE + timedelta(hours=rng.randint(first_hour, last_hour), minutes=rng.randint(0, 59))
+        routes.append((start_stop, visit, start_time))
+    return routes
+
+
+
+def summarize(values):
+    if not values:
+        return None
+    summary = {f"p{q}": float(np.percentile(values, q)) for q in PERCENTILES}
+    summary.update(mean=float(np.mean(values)), max=float(np.max(values)))
+    return summary
+
+
+
+def search_runners(timetable, beam_width=100):
+    # name -> run(stats, start_stop, end_stop, start_time), returning the search's cost
+    stop_coords = timetable.stop_coords()
+    return {
+        'dijkstra_min_time': lambda stats, s, e, t: dijkstra_min_time(timetable, s, e, t, stats=stats)[0],
+        'a_star_min_time': lambda stats, s, e, t: a_star_min_time(timetable, stop_coords, s, e, t, stats=stats)[0],
+        'a_star_min_changes': lambda stats, s, e, t: a_star_min_changes(timetable, s, e, t, stats=stats)[0],
+        'a_star_min_changes_beam': lambda stats, s, e, t: a_star_min_changes_beam(timetable, s, e, t, beam_width, stats=stats)[0],
+    }
+
+
+
+def tabu_runners(timetable, iterations=BENCHMARK_TABU_ITERATIONS, seed=0):
+    # every variant routes its legs with dijkstra_min_time on the time criterion, each run gets a fresh cache;
+    # the leg searches add their counters to the same stats as the tabu search itself
+    variants = {
+        'tabu_search_route': tabu_search_route,
+        'tabu_search_route_dynamic_size': tabu_search_route_dynamic_size,
+        'tabu_search_route_aspiration_rule': tabu_search_route_aspiration_rule,
+        'tabu_search_route_with_sampling': tabu_search_route_with_sampling,
+    }
+    return {
+        name: lambda stats, s, visit, t, variant=variant: variant(
+            s, visit, t, timetable, partial(dijkstra_min_time, stats=stats), "time", iterations=iterations, seed=seed, stats=stats
+        )[0]
+        for name, variant in variants.items()
+    }
+
+
+
+def measure(run, workload, memory=True):
+    # latency, counters and peak memory each come from their own pass, so neither the counters the searches
+    # only keep when stats are given nor tracemalloc show up in the latency
+    latency, found = [], 0
+    for args in workload:
+        t0 = time.perf_counter()
+        cost = run(None, *args)
+        latency.append(time.perf_counter() - t0)
+        if cost is not None and cost != float('inf'):
+            found += 1
+
+    counters = {key: [] for key in REPORTED_COUNTERS}
+    for args in workload:
+        stats = SearchStats()
+        run(stats, *args)
+        for key, values in counters.items():
+            if key in stats:
+                values.append(stats[key])
+
+    result = {
+        'runs': len(workload),
+        'found': found,
+        'latency_sec': summarize(latency),
+    }
+    result.update((key, summarize(values)) for key, values in counters.items())
+
+    if memory:
+        peaks = []
+        for args in workload:
+            tracemalloc.start()
+            run(SearchStats(), *args)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        result['peak_memory_bytes'] = summarize(peaks)
+    return result
+
+
+
+def run_benchmarks(timetable=None, queries=BENCHMARK_QUERIES, routes=BENCHMARK_ROUTES, seed=0,
+                   iterations=BENCHMARK_TABU_ITERATIONS, memory=True, algorithms=None):
+    # one report for the point-to-point searches and the tabu variants over seeded workloads
+    timetable = timetable if timetable is not None else load_timetable()
+    runners = search_runners(timetable)
+    tabu = tabu_runners(timetable, iterations, seed)
+    query_workload = random_queries(timetable, queries, seed)
+    route_workload = random_routes(timetable, routes, seed=seed)
+
+    results = {}
+    for name, run in list(runners.items()) + list(tabu.items()):
+        if algorithms is not None and name not in algorithms:
+            continue
+        workload = query_workload if name in runners else route_workload
+        results[name] = measure(run, workload, memory)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'timetable': {'stops': len(timetable.stops), 'connections': len(timetable)},
+        'workload': {'seed': seed, 'queries': queries, 'routes': routes, 'route_stops': BENCHMARK_ROUTE_STOPS, 'iterations': iterations},
+        'results': results,
+    }
+
+
+
+def write_report(report, file_name):
+    with open(file_name, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import math
+import numpy as np
+from datetime import timedelta
+from src.Graph_algorithms.timetable import Timetable
+
+
+
+# stops sit on a square grid this many meters apart, south-west corner at SYNTHETIC_ORIGIN
+SYNTHETIC_ORIGIN = (51.07, 16.95)
+SYNTHETIC_SPACING = 400
+METERS_PER_DEGREE = 111320
+
+
+
+def _line_route(rng, side, stops, length):
+    # random walk over the grid that never revisits a stop, so every line is a simple path
+    route = [int(rng.integers(stops))]
+    visited = {route[0]}
+    while len(route) < length:
+        x, y = route[-1] % side, route[-1] // side
+        steps = [
+            (x + dx) + (y + dy) * side for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if 0 <= x + dx < side and 0 <= y + dy < side and (x + dx) + (y + dy) * side < stops
+        ]
+        steps = [stop for stop in steps if stop not in visited]
+        if not steps:
+            break
+        route.append(steps[int(rng.integers(len(steps)))])
+        visited.add(route[-1])
+    return route
+
+
+
+def synthetic_compiled(stops=400, lines=40, stops_per_line=20, headway=timedelta(minutes=10),
+                       first_departure=timedelta(hours=5), last_departure=timedelta(hours=23), speed=8.0, seed=0):
+    # a compiled timetable in the layout graph_loader builds, for scaling tests without a CSV
+    rng = np.random.default_rng(seed)
+    side = math.ceil(math.sqrt(stops))
+    grid = np.arange(stops)
+    stop_lat = SYNTHETIC_ORIGIN[0] + (grid // side) * SYNTHETIC_SPACING / METERS_PER_DEGREE
+    stop_lon = SYNTHETIC_ORIGIN[1] + (grid % side) * SYNTHETIC_SPACING / (METERS_PER_DEGREE * math.cos(math.radians(SYNTHETIC_ORIGIN[0])))
+
+    hop_sec = max(60, round(SYNTHETIC_SPACING / speed / 60) * 60)
+    headway_sec = int(headway.total_seconds())
+    first_sec, last_sec = int(first_departure.total_seconds()), int(last_departure.total_seconds())
+    columns = {'departure': [], 'arrival': [], 'start_stop': [], 'end_stop': [], 'line': []}
+
+    for line in range(lines):
+        route = _line_route(rng, side, stops, stops_per_line)
+        if len(route) < 2:
+            continue
+        # hops take hop_sec, or one minute longer where traffic is heavy
+        hops = hop_sec + 60 * rng.integers(0, 2, size=len(route) - 1)
+        for direction in (route, route[::-1]):
+            direction = np.array(direction, dtype=np.int32)
+            offsets = np.concatenate(([0], np.cumsum(hops if direction[0] == route[0] else hops[::-1])))
+            trips = np.arange(first_sec + 60 * int(rng.integers(headway_sec // 60 or 1)), last_sec, headway_sec)
+            columns['departure'].append((trips[:, None] + offsets[:-1]).ravel())
+            columns['arrival'].append((trips[:, None] + offsets[1:]).ravel())
+            columns['start_stop'].append(np.tile(direction[:-1], len(trips)))
+            columns['end_stop'].append(np.tile(direction[1:], len(trips)))
+            columns['line'].append(np.full(len(trips) * (len(direction) - 1), line))
+
+    arrays = {
+        name: np.concatenate(values).astype(np.int32) if values else np.zeros(0, dtype=np.int32)
+        for name, values in columns.items()
+    }
+    arrays['company'] = np.zeros(len(arrays['departure']), dtype=np.int32)
+    order = np.argsort(arrays['departure'], kind='stable')
+    compiled = {name: values[order] for name, values in arrays.items()}
+    compiled.update({
+        'stops': [f"Stop {stop:04d}" for stop in range(stops)],
+        'lines': [f"S{line}" for line in range(lines)],
+        'companies': ['SYNTHETIC'],
+        'stop_lat': stop_lat,
+        'stop_lon': stop_lon,
+    })
+    return compiled
+
+
+
+def synthetic_timetable(**kwargs):
+    return Timetable(synthetic_compiled(**kwargs))
\ No newline at end of file
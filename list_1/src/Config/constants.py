@@ -1,5 +1,5 @@
 from typing import Final
-from datetime import timedelta
+from datetime import datetime, timedelta
 import os
 
 
@@ -10,4 +10,15 @@ FILE_NAME: Final[str] = os.path.join(BASE_DIR, "Data", "connection_graph.csv")
 TIME_COST_PER_SEC: Final[int] = 1
 CHANGE_COST_PER_CHANGE: Final[int] = 1
 
-MIN_CHANGE_TIME: Final[timedelta] = timedelta(minutes=2)
\ No newline at end of file
+MIN_CHANGE_TIME: Final[timedelta] = timedelta(minutes=2)
+MIN_CHANGE_SEC: Final[int] = int(MIN_CHANGE_TIME.total_seconds())
+
+BASE_DATE: Final[datetime] = datetime(1900, 1, 1)
+
+# connections loaded for a query starting at t are the ones departing in [t, t + TIMETABLE_HORIZON]
+TIMETABLE_HORIZON: Final[timedelta] = timedelta(hours=2)
+TIMETABLE_SLICE: Final[timedelta] = timedelta(hours=1)
+
+WALKING_SPEED: Final[float] = 1.4
+FOOTPATH_RADIUS: Final[float] = 400
+FOOTPATH_FANOUT: Final[int] = 8
\ No newline at end of file
@@ -1,5 +1,8 @@
-import csv, heapq, math, time
-from src.Config.constants import FILE_NAME, TIME_COST_PER_SEC, CHANGE_COST_PER_CHANGE, MIN_CHANGE_TIME
+import heapq, math, time
+import numpy as np
+from src.Config.constants import MIN_CHANGE_SEC, TIME_COST_PER_SEC, CHANGE_COST_PER_CHANGE
+from src.Graph_algorithms.graph_loader import load_compiled
+from src.Graph_algorithms.timetable import NO_CONN, NO_LINE, WALK_LINE, rebuild_path, is_walk
 
 
 
@@ -15,179 +18,341 @@ def haversine(lat1, lon1, lat2, lon2):
 
 
 
-def load_stop_coords():
-    stop_coords = {}
-    with open(FILE_NAME, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            try:
-                lat_start = float(row['start_stop_lat'])
-                lon_start = float(row['start_stop_lon'])
-                lat_end = float(row['end_stop_lat'])
-                lon_end = float(row['end_stop_lon'])
-            except Exception as e:
-                continue
+def haversine_array(lat1, lon1, lat2, lon2):
+    # haversine over NumPy arrays, any argument may be a scalar
+    R = 6371000
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = np.radians(np.subtract(lat2, lat1))
+    delta_lambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(delta_phi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2)**2
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-            if row['start_stop'] not in stop_coords:
-                stop_coords[row['start_stop']] = (lat_start, lon_start)
 
-            if row['end_stop'] not in stop_coords:
-                stop_coords[row['end_stop']] = (lat_end, lon_end)
 
-    return stop_coords
+def load_stop_coords():
+    compiled = load_compiled()
+    return {
+        name: (lat, lon)
+        for name, lat, lon in zip(compiled['stops'], compiled['stop_lat'].tolist(), compiled['stop_lon'].tolist())
+    }
 
 
 
-def a_star_min_time(graph, stop_coords, start_stop, end_stop, start_time, max_speed=15):
+def a_star_min_time(timetable, stop_coords, start_stop, end_stop, start_time, max_speed=15, heuristic_table=None, footpaths=None, stats=None):
     t0 = time.time() 
 
     if start_stop not in stop_coords or end_stop not in stop_coords:
-        print("no coordinates for one or more stops")
         run_time = time.time() - t0  
         return None, None, run_time
-    
-    dest_lat, dest_lon = stop_coords[end_stop]
 
-    def heuristic(stop):
-        if stop in stop_coords:
-            lat, lon = stop_coords[stop]
-            distance = haversine(lat, lon, dest_lat, dest_lon)
-            return distance / max_speed 
-        return 0
+    start_id = timetable.stop_id(start_stop)
+    end_id = timetable.stop_id(end_stop)
 
+    if start_id is None or end_id is None:
+        run_time = time.time() - t0
+        return None, None, run_time
+    
+    # a precomputed table replaces the max_speed guess with admissible bounds, one lookup per node
+    if heuristic_table is not None:
+        heuristic = heuristic_table.to(end_id).__getitem__
+    else:
+        dest_lat, dest_lon = stop_coords[end_stop]
+        stops = timetable.stops
+
+        def heuristic(stop):
+            if stops[stop] in stop_coords:
+                lat, lon = stop_coords[stops[stop]]
+                distance = haversine(lat, lon, dest_lat, dest_lon)
+                return distance / max_speed 
+            return 0
+
+    arrival, end, line = timetable.arrival, timetable.end_stop, timetable.line
+    inf = float('inf')
+    start_sec = timetable.start_seconds(start_time)
+    label_conn = [NO_CONN]
+    label_parent = [0]
     open_set = []
-    start_h = heuristic(start_stop)
-    heapq.heappush(open_set, (start_h, 0, start_stop, start_time, []))
-    best_g = {start_stop: 0}
+    start_h = heuristic(start_id)
+    heapq.heappush(open_set, (start_h, 0, start_id, start_sec, 0))
+    # g only grows with the arrival time, so labels are pruned on arrivals kept per (stop, line)
+    # as in dijkstra_min_time; best_arrival holds ride arrivals only
+    best_arrival = {start_id: start_sec}
+    line_arrival = {}
+    counting = stats is not None
+    pops = dominated = stale = missed = max_heap = 0
     
     while open_set:
-        f, g, current_stop, current_time, path = heapq.heappop(open_set)
+        f, g, current_stop, current_time, label = heapq.heappop(open_set)
+        pops += 1
 
-        if current_stop == end_stop:
+        if current_stop == end_id:
             run_time = time.time() - t0  
+            path = rebuild_path(label_conn, label_parent, label)
+            if stats is not None:
+                stats.update(
+                    pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+                    min_change_rejections=missed, max_heap=max_heap
+                )
+            path = timetable.path(path) if footpaths is None else footpaths.path(timetable, path, start_sec)
             return g, path, run_time
-        
-        if current_stop not in graph:
+
+        last_conn = label_conn[label]
+        last_line = line[last_conn] if last_conn > NO_CONN else NO_LINE
+        # as in dijkstra_min_time, a label reached sooner at the same (stop, line) covers this one
+        if label and current_time > line_arrival[(current_stop, WALK_LINE if is_walk(last_conn) else last_line)]:
+            stale += 1
+            continue
+
+        if counting:
+            max_heap = max(max_heap, len(open_set) + 1)
+            missed += timetable.missed_changes(current_stop, current_time, last_line)
+
+        for conn in timetable.earliest_departures(current_stop, current_time, last_line):
+            new_time = arrival[conn]
+            new_g = g + (new_time - current_time) * TIME_COST_PER_SEC
+            new_stop = end[conn]
+            best = best_arrival.get(new_stop, inf)
+            if best + MIN_CHANGE_SEC <= new_time or new_stop == start_id:
+                dominated += 1
+                continue
+            state = (new_stop, line[conn])
+            if new_time >= line_arrival.get(state, inf):
+                dominated += 1
+                continue
+
+            line_arrival[state] = new_time
+            if new_time < best:
+                best_arrival[new_stop] = new_time
+            h = heuristic(new_stop)
+            new_f = new_g + h
+            label_conn.append(conn)
+            label_parent.append(label)
+            heapq.heappush(open_set, (new_f, new_g, new_stop, new_time, len(label_conn) - 1))
+
+        if footpaths is None or is_walk(last_conn):
             continue
 
-        for conn in graph[current_stop]:
-            if conn['departure_time'] >= current_time:
-                if path:
-                    last_line = path[-1]['line']
-                    if last_line != conn['line']:
-                        wait_delta = conn['departure_time'] - current_time
-                        if wait_delta < MIN_CHANGE_TIME:
-                            continue
-
-                wait_time = (conn['departure_time'] - current_time).total_seconds()
-                travel_time = (conn['arrival_time'] - conn['departure_time']).total_seconds()
-                new_g = g + ((wait_time + travel_time) * TIME_COST_PER_SEC)
-                new_stop = conn['end_stop']
-                new_time = conn['arrival_time']
-
-                if new_stop in best_g and new_g >= best_g[new_stop]:
-                    continue
-
-                best_g[new_stop] = new_g
-                h = heuristic(new_stop)
-                new_f = new_g + h
-                new_path = path + [conn]
-                heapq.heappush(open_set, (new_f, new_g, new_stop, new_time, new_path))
+        for code, new_stop, duration in footpaths.walks(current_stop):
+            new_time = current_time + duration
+            new_g = g + duration * TIME_COST_PER_SEC
+            state = (new_stop, WALK_LINE)
+
+            if new_stop == start_id or new_time >= line_arrival.get(state, inf) or best_arrival.get(new_stop, inf) + MIN_CHANGE_SEC <= new_time:
+                dominated += 1
+                continue
+
+            line_arrival[state] = new_time
+            label_conn.append(code)
+            label_parent.append(label)
+            heapq.heappush(open_set, (new_g + heuristic(new_stop), new_g, new_stop, new_time, len(label_conn) - 1))
 
     run_time = time.time() - t0  
+    if stats is not None:
+        stats.update(
+            pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+            min_change_rejections=missed, max_heap=max_heap
+        )
     return None, None, run_time
 
 
 
-def a_star_min_changes(graph, start_stop, end_stop, start_time):
+def _keep_label(best, state, changes, arrival):
+    # best[state] is the Pareto front of (changes, arrival) labels kept at a state; a label with
+    # fewer changes but a later arrival does not prune this one, which may still catch a
+    # connection the later one has missed, so False only when some label is no worse in both
+    front = best.setdefault(state, [])
+    for best_changes, best_time in front:
+        if best_changes <= changes and best_time <= arrival:
+            return False
+    front[:] = [(c, t) for c, t in front if c < changes or t < arrival]
+    front.append((changes, arrival))
+    return True
+
+
+
+def a_star_min_changes(timetable, start_stop, end_stop, start_time, footpaths=None, stats=None):
     t0 = time.time()
+    start_id = timetable.stop_id(start_stop)
+    end_id = timetable.stop_id(end_stop)
 
+    if start_id is None or end_id is None:
+        run_time = time.time() - t0
+        return None, None, run_time
+
+    arrival, end, line = timetable.arrival, timetable.end_stop, timetable.line
+    label_conn = [NO_CONN]
+    label_parent = [0]
     open_set = []
-    heapq.heappush(open_set, (0, 0, start_stop, start_time, None, []))
+    start_sec = timetable.start_seconds(start_time)
+    heapq.heappush(open_set, (0, 0, start_id, start_sec, NO_LINE, 0))
     best = {}  
+    counting = stats is not None
+    pops = dominated = stale = missed = max_heap = 0
 
     while open_set:
-        f, g, current_stop, current_time, current_line, path = heapq.heappop(open_set)
+        f, g, current_stop, current_time, current_line, label = heapq.heappop(open_set)
+        pops += 1
 
-        if current_stop == end_stop:
+        if current_stop == end_id:
             run_time = time.time() - t0
+            path = rebuild_path(label_conn, label_parent, label)
+            if stats is not None:
+                stats.update(
+                    pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+                    min_change_rejections=missed, max_heap=max_heap
+                )
+            path = timetable.path(path) if footpaths is None else footpaths.path(timetable, path, start_sec)
             return g, path, run_time
-        
-        if current_stop not in graph:
+
+        # a label that has since left the Pareto front of its state is dominated by a kept one
+        if label and (g, current_time) not in best[(current_stop, current_line)]:
+            stale += 1
             continue
 
-        for conn in graph[current_stop]:
-            if conn['departure_time'] >= current_time:
-                new_line = conn['line']
-                new_changes = g
-
-                if current_line is not None and new_line != current_line:
-                    wait_time = conn['departure_time'] - current_time
-                    if wait_time < MIN_CHANGE_TIME:
-                        continue 
-                    new_changes += CHANGE_COST_PER_CHANGE
-                
-                new_time = conn['arrival_time']
-                state = (conn['end_stop'], new_line)
-
-                if state in best:
-                    best_changes, best_time = best[state]
-                    if new_changes > best_changes or (new_changes == best_changes and new_time >= best_time):
-                        continue
-
-                best[state] = (new_changes, new_time)
-                new_f = new_changes  
-                new_path = path + [conn]
-                heapq.heappush(open_set, (new_f, new_changes, conn['end_stop'], new_time, new_line, new_path))
+        ready_line = NO_LINE if current_line == WALK_LINE else current_line
+        if counting:
+            max_heap = max(max_heap, len(open_set) + 1)
+            missed += timetable.missed_changes(current_stop, current_time, ready_line)
+
+        for conn in timetable.earliest_departures(current_stop, current_time, ready_line):
+            new_line = line[conn]
+            new_changes = g
+
+            if current_line != NO_LINE and new_line != current_line:
+                new_changes += CHANGE_COST_PER_CHANGE
+            
+            new_time = arrival[conn]
+            new_stop = end[conn]
+            state = (new_stop, new_line)
+
+            if not _keep_label(best, state, new_changes, new_time):
+                dominated += 1
+                continue
+
+            new_f = new_changes  
+            label_conn.append(conn)
+            label_parent.append(label)
+            heapq.heappush(open_set, (new_f, new_changes, new_stop, new_time, new_line, len(label_conn) - 1))
+
+        if footpaths is None or is_walk(label_conn[label]):
+            continue
+
+        # a walk from the origin keeps the first boarding free, any later walk is a transfer
+        walk_line = NO_LINE if current_line == NO_LINE else WALK_LINE
+        for code, new_stop, duration in footpaths.walks(current_stop):
+            new_time = current_time + duration
+            state = (new_stop, walk_line)
+
+            if not _keep_label(best, state, g, new_time):
+                dominated += 1
+                continue
+
+            label_conn.append(code)
+            label_parent.append(label)
+            heapq.heappush(open_set, (g, g, new_stop, new_time, walk_line, len(label_conn) - 1))
     
     run_time = time.time() - t0  
+    if stats is not None:
+        stats.update(
+            pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+            min_change_rejections=missed, max_heap=max_heap
+        )
     return None, None, run_time
 
 
 
-def a_star_min_changes_beam(graph, start_stop, end_stop, start_time, beam_width=100):
+def a_star_min_changes_beam(timetable, start_stop, end_stop, start_time, beam_width=100, footpaths=None, stats=None):
     t0 = time.time()
+    start_id = timetable.stop_id(start_stop)
+    end_id = timetable.stop_id(end_stop)
+
+    if start_id is None or end_id is None:
+        run_time = time.time() - t0
+        return None, None, run_time
+
+    arrival, end, line = timetable.arrival, timetable.end_stop, timetable.line
+    label_conn = [NO_CONN]
+    label_parent = [0]
     open_set = []
-    heapq.heappush(open_set, (0, 0, start_stop, start_time, None, []))
+    start_sec = timetable.start_seconds(start_time)
+    heapq.heappush(open_set, (0, 0, start_id, start_sec, NO_LINE, 0))
     best = {}  
+    counting = stats is not None
+    pops = dominated = stale = missed = max_heap = beam_dropped = 0
 
     while open_set:
         if len(open_set) > beam_width:
+            # labels cut off here are never expanded, beam_dropped shows how much the beam throws away
+            beam_dropped += len(open_set) - beam_width
             open_set = heapq.nsmallest(beam_width, open_set)
             heapq.heapify(open_set)
 
-        f, g, current_stop, current_time, current_line, path = heapq.heappop(open_set)
+        f, g, current_stop, current_time, current_line, label = heapq.heappop(open_set)
+        pops += 1
         
-        if current_stop == end_stop:
+        if current_stop == end_id:
             run_time = time.time() - t0
+            path = rebuild_path(label_conn, label_parent, label)
+            if stats is not None:
+                stats.update(
+                    pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+                    min_change_rejections=missed, max_heap=max_heap, beam_dropped=beam_dropped
+                )
+            path = timetable.path(path) if footpaths is None else footpaths.path(timetable, path, start_sec)
             return g, path, run_time
-        
-        if current_stop not in graph:
+
+        # a label that has since left the Pareto front of its state is dominated by a kept one
+        if label and (g, current_time) not in best[(current_stop, current_line)]:
+            stale += 1
+            continue
+
+        ready_line = NO_LINE if current_line == WALK_LINE else current_line
+        if counting:
+            max_heap = max(max_heap, len(open_set) + 1)
+            missed += timetable.missed_changes(current_stop, current_time, ready_line)
+
+        for conn in timetable.earliest_departures(current_stop, current_time, ready_line):
+            new_line = line[conn]
+            new_changes = g
+
+            if current_line != NO_LINE and new_line != current_line:
+                new_changes += CHANGE_COST_PER_CHANGE
+            
+            new_time = arrival[conn]
+            new_stop = end[conn]
+            state = (new_stop, new_line)
+
+            if not _keep_label(best, state, new_changes, new_time):
+                dominated += 1
+                continue
+
+            new_f = new_changes 
+            label_conn.append(conn)
+            label_parent.append(label)
+            heapq.heappush(open_set, (new_f, new_changes, new_stop, new_time, new_line, len(label_conn) - 1))
+
+        if footpaths is None or is_walk(label_conn[label]):
             continue
 
-        for conn in graph[current_stop]:
-            if conn['departure_time'] >= current_time:
-                new_line = conn['line']
-                new_changes = g
-
-                if current_line is not None and new_line != current_line:
-                    wait_delta = conn['departure_time'] - current_time
-                    if wait_delta < MIN_CHANGE_TIME:
-                        continue 
-                    new_changes += CHANGE_COST_PER_CHANGE
-                
-                new_time = conn['arrival_time']
-                state = (conn['end_stop'], new_line)
-
-                if state in best:
-                    best_changes, best_time = best[state]
-                    if new_changes > best_changes or (new_changes == best_changes and new_time >= best_time):
-                        continue
-
-                best[state] = (new_changes, new_time)
-                new_f = new_changes 
-                new_path = path + [conn]
-                heapq.heappush(open_set, (new_f, new_changes, conn['end_stop'], new_time, new_line, new_path))
+        # a walk from the origin keeps the first boarding free, any later walk is a transfer
+        walk_line = NO_LINE if current_line == NO_LINE else WALK_LINE
+        for code, new_stop, duration in footpaths.walks(current_stop):
+            new_time = current_time + duration
+            state = (new_stop, walk_line)
+
+            if not _keep_label(best, state, g, new_time):
+                dominated += 1
+                continue
+
+            label_conn.append(code)
+            label_parent.append(label)
+            heapq.heappush(open_set, (g, g, new_stop, new_time, walk_line, len(label_conn) - 1))
     
     run_time = time.time() - t0  
+    if stats is not None:
+        stats.update(
+            pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+            min_change_rejections=missed, max_heap=max_heap, beam_dropped=beam_dropped
+        )
     return None, None, run_time
\ No newline at end of file
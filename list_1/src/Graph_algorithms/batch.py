@@ -0,0 +1,150 @@
+from collections import deque
+from functools import partial
+from src.Config.constants import TIME_COST_PER_SEC
+from src.Graph_algorithms.graph_loader import load_timetable
+from src.Graph_algorithms.csa import csa_one_to_all, csa_path
+from src.Graph_algorithms.dijkstra import dijkstra_one_to_all, label_path
+from src.Graph_algorithms.a_star import a_star_min_time, a_star_min_changes
+from src.Graph_algorithms.heuristics import HeuristicTable
+from src.Graph_algorithms.raptor import raptor_min_changes
+from src.Utilities.process_pool import fork_pool
+
+
+
+# groups queued per worker, enough to keep workers busy without holding every result in memory
+BATCH_PREFETCH = 4
+
+
+
+def _csa_group(timetable, start_stop, start_time, end_stops):
+    start_id = timetable.stop_id(start_stop)
+    end_ids = [timetable.stop_id(end_stop) for end_stop in end_stops]
+    if start_id is None:
+        return [(None, None)] * len(end_stops)
+
+    start_sec = timetable.start_seconds(start_time)
+    targets = [end_id for end_id in end_ids if end_id is not None]
+    stop_arrival, stop_conn, boarded_from = csa_one_to_all(timetable, start_id, start_sec, targets)
+
+    results = []
+    for end_id in end_ids:
+        if end_id is None or end_id not in stop_arrival:
+            results.append((None, None))
+        else:
+            path = csa_path(stop_conn, boarded_from, end_id)
+            results.append(((stop_arrival[end_id] - start_sec) * TIME_COST_PER_SEC, timetable.path(path)))
+    return results
+
+
+
+def _dijkstra_group(timetable, start_stop, start_time, end_stops):
+    arrival, best_label, labels, _ = dijkstra_one_to_all(timetable, start_stop, start_time)
+    if arrival is None:
+        return [(None, None)] * len(end_stops)
+
+    start_sec = timetable.start_seconds(start_time)
+    results = []
+    for end_stop in end_stops:
+        end_id = timetable.stop_id(end_stop)
+        if end_id is None or arrival[end_id] == float('inf'):
+            results.append((None, None))
+        else:
+            cost = (int(arrival[end_id]) - start_sec) * TIME_COST_PER_SEC
+            results.append((cost, label_path(timetable, labels, best_label[end_id])))
+    return results
+
+
+
+def _single_group(search, timetable, start_stop, start_time, end_stops):
+    results = []
+    for end_stop in end_stops:
+        cost, path, _ = search(timetable, start_stop, end_stop, start_time)
+        results.append((cost, path))
+    return results
+
+
+
+def _a_star_time(timetable, start_stop, end_stop, start_time):
+    # the max_speed guess is not admissible, the batch's HeuristicTable is
+    return a_star_min_time(
+        timetable, timetable.stop_coords(), start_stop, end_stop, start_time, heuristic_table=_worker_heuristic_table
+    )
+
+
+
+# one-to-all searches answer a whole group at once, the others are run per destination;
+# time queries go to 'csa', RAPTOR is only offered for the change criterion it is faster at
+ALGORITHMS = {
+    'csa': _csa_group,
+    'dijkstra': _dijkstra_group,
+    'a_star': partial(_single_group, _a_star_time),
+    'a_star_changes': partial(_single_group, a_star_min_changes),
+    'raptor_changes': partial(_single_group, raptor_min_changes),
+}
+
+
+
+_worker_timetable = None
+_worker_heuristic_table = None
+
+
+
+def _init_worker(timetable, heuristic_table=None):
+    # under fork the timetable and heuristic table are inherited, not pickled
+    global _worker_timetable, _worker_heuristic_table
+    _worker_timetable = timetable
+    _worker_heuristic_table = heuristic_table
+
+
+
+def _route_group(algorithm, start_stop, start_time, indexed_ends):
+    routes = ALGORITHMS[algorithm](_worker_timetable, start_stop, start_time, [end_stop for _, end_stop in indexed_ends])
+    return [(index, cost, path) for (index, _), (cost, path) in zip(indexed_ends, routes)]
+
+
+
+def group_queries(queries):
+    # (start_stop, start_time) -> [(position, end_stop)], in order of first appearance
+    groups = {}
+    for index, (start_stop, end_stop, start_time) in enumerate(queries):
+        groups.setdefault((start_stop, start_time), []).append((index, end_stop))
+    return groups
+
+
+
+def route_batch(queries, algorithm='csa', workers=1, timetable=None):
+    # checked here rather than in the generator, so a bad algorithm fails at call time
+    if algorithm not in ALGORITHMS:
+        raise ValueError("wrong algorithm")
+
+    queries = list(queries)
+    if timetable is None:
+        timetable = load_timetable()
+    return _route_batch(queries, algorithm, workers, timetable)
+
+
+
+def _route_batch(queries, algorithm, workers, timetable):
+    groups = group_queries(queries)
+    # one table for the whole batch, built before the workers fork
+    heuristic_table = HeuristicTable(timetable) if algorithm == 'a_star' else None
+
+    # yields (query, cost, path) group by group, so results can be written out as they arrive
+    if workers is None or workers <= 1:
+        _init_worker(timetable, heuristic_table)
+        for (start_stop, start_time), indexed_ends in groups.items():
+            for index, cost, path in _route_group(algorithm, start_stop, start_time, indexed_ends):
+                yield queries[index], cost, path
+        return
+
+    with fork_pool(workers, _init_worker, (timetable, heuristic_table)) as pool:
+        pending = deque()
+        for (start_stop, start_time), indexed_ends in groups.items():
+            pending.append(pool.submit(_route_group, algorithm, start_stop, start_time, indexed_ends))
+            while len(pending) >= workers * BATCH_PREFETCH:
+                for index, cost, path in pending.popleft().result():
+                    yield queries[index], cost, path
+
+        while pending:
+            for index, cost, path in pending.popleft().result():
+                yield queries[index], cost, path
\ No newline at end of file
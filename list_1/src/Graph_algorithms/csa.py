@@ -0,0 +1,110 @@
+import time
+from bisect import bisect_left
+from src.Config.constants import MIN_CHANGE_SEC, TIME_COST_PER_SEC
+
+
+
+SCAN_CHUNK = 4096
+
+
+
+def scan_connections(timetable, first=0):
+    # columns are converted chunk by chunk, so early termination stays cheap
+    order = timetable.scan_order
+    for chunk_start in range(first, len(order), SCAN_CHUNK):
+        chunk = order[chunk_start:chunk_start + SCAN_CHUNK]
+        yield from zip(
+            chunk.tolist(), timetable.departure[chunk].tolist(), timetable.arrival[chunk].tolist(),
+            timetable.start_stop[chunk].tolist(), timetable.end_stop[chunk].tolist(), timetable.line[chunk].tolist()
+        )
+
+
+
+def csa_one_to_all(timetable, start_id, start_sec, targets=None):
+    # earliest arrival at every stop, the scan stops early once all targets are settled
+    inf = float('inf')
+    stop_arrival = {start_id: start_sec}
+    stop_conn = {start_id: -1}
+    # riding on a line needs no MIN_CHANGE_TIME, so arrivals are also kept per (stop, line)
+    line_arrival = {}
+    line_conn = {}
+    boarded_from = {}
+
+    if targets is not None:
+        targets = set(targets)
+    pending = targets - {start_id} if targets is not None else None
+    first = bisect_left(timetable.scan_departure, start_sec)
+    target_arrival = inf if pending or pending is None else start_sec
+
+    for conn, dep, arr, start, end, line in scan_connections(timetable, first):
+        if dep >= target_arrival:
+            break
+
+        state = (start, line)
+        if line_arrival.get(state, inf) <= dep:
+            previous = line_conn[state]
+        elif start == start_id:
+            previous = -1
+        elif stop_arrival.get(start, inf) + MIN_CHANGE_SEC <= dep:
+            previous = stop_conn[start]
+        else:
+            continue
+
+        improved = False
+        state = (end, line)
+        if arr < line_arrival.get(state, inf):
+            line_arrival[state] = arr
+            line_conn[state] = conn
+            improved = True
+
+        if arr < stop_arrival.get(end, inf):
+            stop_arrival[end] = arr
+            stop_conn[end] = conn
+            improved = True
+            if pending is not None and end in targets:
+                pending.discard(end)
+                if not pending:
+                    target_arrival = max(stop_arrival[target] for target in targets)
+
+        if improved:
+            boarded_from[conn] = previous
+
+    return stop_arrival, stop_conn, boarded_from
+
+
+
+def csa_path(stop_conn, boarded_from, end_id):
+    path = []
+    conn = stop_conn[end_id]
+    while conn != -1:
+        path.append(conn)
+        conn = boarded_from[conn]
+    path.reverse()
+    return path
+
+
+
+def csa_min_time(timetable, start_stop, end_stop, start_time):
+    t0 = time.time()
+    start_id = timetable.stop_id(start_stop)
+    end_id = timetable.stop_id(end_stop)
+
+    if start_id is None or end_id is None:
+        run_time = time.time() - t0
+        return None, None, run_time
+
+    if start_id == end_id:
+        run_time = time.time() - t0
+        return 0, [], run_time
+
+    start_sec = timetable.start_seconds(start_time)
+    stop_arrival, stop_conn, boarded_from = csa_one_to_all(timetable, start_id, start_sec, (end_id,))
+
+    if end_id not in stop_arrival:
+        run_time = time.time() - t0
+        return None, None, run_time
+
+    path = csa_path(stop_conn, boarded_from, end_id)
+
+    run_time = time.time() - t0
+    return (stop_arrival[end_id] - start_sec) * TIME_COST_PER_SEC, timetable.path(path), run_time
\ No newline at end of file
@@ -1,41 +1,241 @@
 import heapq, time
-from src.Config.constants import MIN_CHANGE_TIME, TIME_COST_PER_SEC
+import numpy as np
+from src.Config.constants import MIN_CHANGE_SEC, TIME_COST_PER_SEC
+from src.Graph_algorithms.timetable import NO_CONN, NO_LINE, WALK_LINE, rebuild_path, is_walk
 
 
 
-def dijkstra_min_time(graph, start_stop, end_stop, start_time):
+def dijkstra_min_time(timetable, start_stop, end_stop, start_time, footpaths=None, stats=None):
     t0 = time.time()  
-    best_arrival = {start_stop: start_time}
+    start_id = timetable.stop_id(start_stop)
+    end_id = timetable.stop_id(end_stop)
+
+    if start_id is None or end_id is None:
+        run_time = time.time() - t0
+        return None, None, run_time
+
+    arrival, end, line = timetable.arrival, timetable.end_stop, timetable.line
+    inf = float('inf')
+    start_sec = timetable.start_seconds(start_time)
+    # labels are kept per (stop, line) as in _settle, walks arriving on WALK_LINE: a ride on another
+    # line only prunes one when it could change onto it in time, and a walk never prunes a ride,
+    # since no walk may follow it; best_arrival holds ride arrivals only
+    best_arrival = {start_id: start_sec}
+    line_arrival = {}
+    # label i was reached by label_conn[i] from label label_parent[i], label 0 is the origin
+    label_conn = [NO_CONN]
+    label_parent = [0]
     queue = []
-    heapq.heappush(queue, (start_time, start_stop, []))
+    heapq.heappush(queue, (start_sec, start_id, 0))
+    # counters for stats, the ones needing extra lookups only run when stats are asked for;
+    # the origin label is not a push, hence len(label_conn) - 1
+    counting = stats is not None
+    pops = dominated = stale = missed = max_heap = 0
     
     while queue:
-        current_time, current_stop, path = heapq.heappop(queue)
+        current_time, current_stop, label = heapq.heappop(queue)
+        pops += 1
 
-        if current_stop == end_stop:
+        if current_stop == end_id:
             run_time = time.time() - t0  
-            return (current_time - start_time).total_seconds() * TIME_COST_PER_SEC, path, run_time
+            if stats is not None:
+                stats.update(
+                    pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+                    min_change_rejections=missed, max_heap=max_heap
+                )
+            path = rebuild_path(label_conn, label_parent, label)
+            path = timetable.path(path) if footpaths is None else footpaths.path(timetable, path, start_sec)
+            return (current_time - start_sec) * TIME_COST_PER_SEC, path, run_time
         
-        if current_stop not in graph:
+        last_conn = label_conn[label]
+        # after a walk any line can be boarded at once, the walk already took the change time
+        last_line = line[last_conn] if last_conn > NO_CONN else NO_LINE
+        # a label whose (stop, line) state was since reached sooner is covered by that label
+        if label and current_time > line_arrival[(current_stop, WALK_LINE if is_walk(last_conn) else last_line)]:
+            stale += 1
+            continue
+
+        if counting:
+            max_heap = max(max_heap, len(queue) + 1)
+            missed += timetable.missed_changes(current_stop, current_time, last_line)
+
+        for conn in timetable.earliest_departures(current_stop, current_time, last_line):
+            new_stop = end[conn]
+            new_arrival = arrival[conn]
+            best = best_arrival.get(new_stop, inf)
+            if best + MIN_CHANGE_SEC <= new_arrival or new_stop == start_id:
+                dominated += 1
+                continue
+            state = (new_stop, line[conn])
+            if new_arrival >= line_arrival.get(state, inf):
+                dominated += 1
+                continue
+
+            line_arrival[state] = new_arrival
+            if new_arrival < best:
+                best_arrival[new_stop] = new_arrival
+            label_conn.append(conn)
+            label_parent.append(label)
+            heapq.heappush(queue, (new_arrival, new_stop, len(label_conn) - 1))
+
+        if footpaths is None or is_walk(last_conn):
+            continue
+
+        for code, new_stop, duration in footpaths.walks(current_stop):
+            new_arrival = current_time + duration
+            state = (new_stop, WALK_LINE)
+
+            if new_stop == start_id or new_arrival >= line_arrival.get(state, inf) or best_arrival.get(new_stop, inf) + MIN_CHANGE_SEC <= new_arrival:
+                dominated += 1
+                continue
+
+            line_arrival[state] = new_arrival
+            label_conn.append(code)
+            label_parent.append(label)
+            heapq.heappush(queue, (new_arrival, new_stop, len(label_conn) - 1))
+
+    run_time = time.time() - t0
+    if stats is not None:
+        stats.update(
+            pops=pops, pushes=len(label_conn) - 1, dominated=dominated, stale=stale,
+            min_change_rejections=missed, max_heap=max_heap
+        )
+    return None, None, run_time
+
+
+
+def _settle(timetable, start_id, start_sec, best_arrival, best_label, line_arrival, label_conn, label_parent, max_sec=None,
+            counters=None):
+    # expands one search into the shared arrays, only stops it improves get new labels;
+    # a label is kept per (stop, line) because staying on a line needs no MIN_CHANGE_TIME;
+    # counters, when given, gathers pops, dominated, stale and max_heap over every call
+    arrival, end, line = timetable.arrival, timetable.end_stop, timetable.line
+    improved = set()
+    label_conn.append(NO_CONN)
+    label_parent.append(len(label_conn) - 1)
+    queue = [(start_sec, start_id, len(label_conn) - 1)]
+    pops = dominated = stale = max_heap = 0
+
+    while queue:
+        max_heap = max(max_heap, len(queue))
+        current_time, current_stop, label = heapq.heappop(queue)
+        if max_sec is not None and current_time > max_sec:
+            break
+        pops += 1
+
+        last_conn = label_conn[label]
+        last_line = line[last_conn] if last_conn != NO_CONN else NO_LINE
+        if last_conn != NO_CONN and current_time > line_arrival[(current_stop, last_line)]:
+            stale += 1
             continue
 
-        for conn in graph[current_stop]:
-            if conn['departure_time'] >= current_time:
-                if path:
-                    last_line = path[-1]['line']
-                    if last_line != conn['line']:
-                        wait_time = conn['departure_time'] - current_time
-                        if wait_time < MIN_CHANGE_TIME:
-                            continue
+        for conn in timetable.earliest_departures(current_stop, current_time, last_line):
+            new_stop = end[conn]
+            new_arrival = arrival[conn]
+            state = (new_stop, line[conn])
+
+            if new_stop == start_id or new_arrival >= line_arrival.get(state, float('inf')):
+                dominated += 1
+                continue
+            if best_arrival[new_stop] + MIN_CHANGE_SEC <= new_arrival:
+                dominated += 1
+                continue
+
+            line_arrival[state] = new_arrival
+            label_conn.append(conn)
+            label_parent.append(label)
+            if new_arrival < best_arrival[new_stop]:
+                best_arrival[new_stop] = new_arrival
+                best_label[new_stop] = len(label_conn) - 1
+                improved.add(new_stop)
+            heapq.heappush(queue, (new_arrival, new_stop, len(label_conn) - 1))
+
+    if counters is not None:
+        counters['pops'] = counters.get('pops', 0) + pops
+        counters['dominated'] = counters.get('dominated', 0) + dominated
+        counters['stale'] = counters.get('stale', 0) + stale
+        counters['max_heap'] = max(counters.get('max_heap', 0), max_heap)
+    return improved
+
+
+
+def label_path(timetable, labels, label):
+    label_conn, label_parent = labels
+    return timetable.path(rebuild_path(label_conn, label_parent, label))
+
+
+
+def dijkstra_one_to_all(timetable, start_stop, start_time, max_time=None, stats=None):
+    t0 = time.time()
+    start_id = timetable.stop_id(start_stop)
+
+    if start_id is None:
+        run_time = time.time() - t0
+        return None, None, None, run_time
+
+    n = len(timetable.stops)
+    start_sec = timetable.start_seconds(start_time)
+    max_sec = timetable.to_seconds(max_time) if max_time is not None else None
+    best_arrival = [float('inf')] * n
+    best_label = [-1] * n
+    label_conn, label_parent = [], []
+    counters = {} if stats is not None else None
+
+    _settle(timetable, start_id, start_sec, best_arrival, best_label, {}, label_conn, label_parent, max_sec, counters)
+    best_arrival[start_id] = start_sec
+    best_label[start_id] = 0
+    arrival = np.array(best_arrival, dtype=np.float64)
+    best_label = np.array(best_label, dtype=np.int64)
+
+    # arrivals past max_time were never settled, so they are dropped rather than reported too late
+    if max_sec is not None:
+        beyond = arrival > max_sec
+        arrival[beyond] = np.inf
+        best_label[beyond] = -1
+
+    # arrival[stop] is in seconds since BASE_DATE, inf where the stop was not reached
+    run_time = time.time() - t0
+    if stats is not None:
+        stats.update(pushes=len(label_conn) - 1, **counters)
+    return arrival, best_label, (label_conn, label_parent), run_time
+
+
+
+def dijkstra_profile(timetable, start_stop, window_start, window_end, stats=None):
+    t0 = time.time()
+    start_id = timetable.stop_id(start_stop)
+
+    if start_id is None:
+        run_time = time.time() - t0
+        return None, None, run_time
+
+    n = len(timetable.stops)
+    start_sec = timetable.start_seconds(window_start)
+    end_sec = timetable.to_seconds(window_end)
+    outgoing = timetable.departure[timetable.offsets[start_id]:timetable.offsets[start_id + 1]]
+    departures = np.unique(outgoing[np.searchsorted(outgoing, start_sec):np.searchsorted(outgoing, end_sec, side='right')])
 
-                arrival = conn['arrival_time']
+    # departures are searched latest first and share best_arrival, so a later search prunes
+    # every stop that an earlier departure cannot reach any sooner, leaving only Pareto pairs
+    best_arrival = [float('inf')] * n
+    best_label = [-1] * n
+    line_arrival = {}
+    label_conn, label_parent = [], []
+    profiles = {}
+    counters = {} if stats is not None else None
 
-                if conn['end_stop'] in best_arrival and arrival >= best_arrival[conn['end_stop']]:
-                    continue
+    for departure in departures[::-1].tolist():
+        improved = _settle(timetable, start_id, departure, best_arrival, best_label, line_arrival, label_conn, label_parent,
+                           counters=counters)
+        for stop in improved:
+            profiles.setdefault(stop, []).append((departure, int(best_arrival[stop]), best_label[stop]))
 
-                best_arrival[conn['end_stop']] = arrival
-                new_path = path + [conn]
-                heapq.heappush(queue, (arrival, conn['end_stop'], new_path))
+    # profiles[stop] lists (departure, arrival, label) in seconds, both increasing
+    for profile in profiles.values():
+        profile.reverse()
 
     run_time = time.time() - t0
-    return None, None, run_time
\ No newline at end of file
+    if stats is not None:
+        # one origin label per departure searched
+        stats.update(departures=len(departures), pushes=len(label_conn) - len(departures), **counters)
+    return profiles, (label_conn, label_parent), run_time
\ No newline at end of file
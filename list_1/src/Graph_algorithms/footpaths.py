@@ -0,0 +1,81 @@
+import numpy as np
+from src.Config.constants import MIN_CHANGE_SEC, WALKING_SPEED, FOOTPATH_RADIUS, FOOTPATH_FANOUT
+from src.Graph_algorithms.stop_index import stop_index_from_timetable
+from src.Graph_algorithms.timetable import NO_CONN, walk_code, is_walk
+
+
+
+WALK = 'WALK'
+
+
+
+class Footpaths:
+    # walking transfers between nearby stops in CSR layout: footpaths out of stop s are
+    # offsets[s]:offsets[s + 1], nearest first, with the walking time in seconds
+    def __init__(self, timetable, radius=FOOTPATH_RADIUS, walking_speed=WALKING_SPEED, max_fanout=FOOTPATH_FANOUT):
+        self.radius = radius
+        self.walking_speed = walking_speed
+        self.max_fanout = max_fanout
+
+        index = stop_index_from_timetable(timetable)
+        n = len(timetable.stops)
+        targets, durations, counts = [], [], np.zeros(n, dtype=np.int64)
+        for stop_id, (near, distance) in enumerate(index.radius_many(index.lat, index.lon, radius)):
+            keep = near != stop_id
+            near, distance = near[keep][:max_fanout], distance[keep][:max_fanout]
+            targets.append(near)
+            # a walk is a transfer, so it never takes less than changing at the same stop
+            durations.append(np.maximum(np.ceil(distance / walking_speed), MIN_CHANGE_SEC))
+            counts[stop_id] = len(near)
+
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.target = np.concatenate(targets).astype(np.int32) if n else np.zeros(0, dtype=np.int32)
+        self.duration = np.concatenate(durations).astype(np.int32) if n else np.zeros(0, dtype=np.int32)
+        self.source = np.repeat(np.arange(n, dtype=np.int32), counts)
+
+
+    def __len__(self):
+        return len(self.target)
+
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.target.nbytes + self.duration.nbytes + self.source.nbytes
+
+
+    def walks(self, stop_id):
+        # (code, end stop, seconds) for every footpath out of stop_id
+        lo, hi = self.offsets[stop_id], self.offsets[stop_id + 1]
+        return zip(range(walk_code(lo), walk_code(hi), -1), self.target[lo:hi].tolist(), self.duration[lo:hi].tolist())
+
+
+    def leg(self, timetable, code, departure_sec):
+        footpath = NO_CONN - 1 - code
+        start_id, end_id = int(self.source[footpath]), int(self.target[footpath])
+        return {
+            'company': WALK,
+            'line': WALK,
+            'departure_time': timetable.to_datetime(departure_sec),
+            'arrival_time': timetable.to_datetime(departure_sec + int(self.duration[footpath])),
+            'start_stop': timetable.stops[start_id],
+            'end_stop': timetable.stops[end_id],
+            'start_stop_lat': float(timetable.stop_lat[start_id]),
+            'start_stop_lon': float(timetable.stop_lon[start_id]),
+            'end_stop_lat': float(timetable.stop_lat[end_id]),
+            'end_stop_lon': float(timetable.stop_lon[end_id]),
+        }
+
+
+    def path(self, timetable, codes, start_sec):
+        # a walk starts as soon as the previous leg arrives, or at start_sec as the first leg
+        path = []
+        current_sec = start_sec
+        for code in codes:
+            if is_walk(code):
+                path.append(self.leg(timetable, code, current_sec))
+                current_sec += int(self.duration[NO_CONN - 1 - code])
+            else:
+                path.append(timetable.connection(code))
+                current_sec = int(timetable.arrival[code])
+        return path
\ No newline at end of file
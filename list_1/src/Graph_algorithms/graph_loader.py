@@ -1,6 +1,21 @@
 from datetime import datetime, timedelta
-import csv
-from src.Config.constants import FILE_NAME
+import hashlib, json, os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from src.Config.constants import FILE_NAME, BASE_DATE, TIMETABLE_HORIZON, TIMETABLE_SLICE
+from src.Graph_algorithms.timetable import Timetable
+
+
+
+CACHE_VERSION = 2
+TIME_COLUMNS = ("departure", "arrival")
+ID_COLUMNS = ("start_stop", "end_stop", "line", "company")
+STOP_COLUMNS = ("stop_lat", "stop_lon")
+CSV_COLUMNS = (
+    "company", "line", "departure_time", "arrival_time", "start_stop", "end_stop",
+    "start_stop_lat", "start_stop_lon", "end_stop_lat", "end_stop_lon",
+)
 
 
 
@@ -12,33 +27,264 @@ def parse_extended_time(time_str):
 
 
 
+def cache_dir(file_name=FILE_NAME):
+    return os.path.splitext(file_name)[0] + "_cache"
+
+
+
+def file_hash(file_name):
+    sha = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+
+def _checked_seconds(time_str):
+    try:
+        h, m, s = map(int, time_str.split(':'))
+    except (ValueError, TypeError, AttributeError):
+        return np.nan
+    if h < 0 or not 0 <= m < 60 or not 0 <= s < 60:
+        return np.nan
+    return h * 3600 + m * 60 + s
+
+
+
+def parse_seconds_array(times):
+    # H:MM:SS strings as seconds, NaN where the value is not valid (hours may go past 24);
+    # the usual HH:MM:SS is decoded from the raw characters, anything else goes through _checked_seconds
+    values = np.asarray(times, dtype=object)
+    seconds = np.full(len(values), np.nan)
+    fixed = np.array([isinstance(value, str) and len(value) == 8 for value in values], dtype=bool)
+
+    codes = np.asarray(values[fixed], dtype='U8').view(np.uint32).reshape(-1, 8).astype(np.int64) - ord('0')
+    digits = codes[:, [0, 1, 3, 4, 6, 7]]
+    h = codes[:, 0] * 10 + codes[:, 1]
+    m = codes[:, 3] * 10 + codes[:, 4]
+    s = codes[:, 6] * 10 + codes[:, 7]
+    colon = ord(':') - ord('0')
+    valid = (codes[:, 2] == colon) & (codes[:, 5] == colon) & ((digits >= 0) & (digits <= 9)).all(axis=1) & (m < 60) & (s < 60)
+    seconds[fixed] = np.where(valid, h * 3600 + m * 60 + s, np.nan)
+
+    others = np.flatnonzero(~fixed)
+    seconds[others] = [_checked_seconds(value) for value in values[others]]
+    return seconds
+
+
+
+def _checked_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+
+def valid_coordinates(lat, lon):
+    return (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+
+
+
+def compile_timetable(file_name=FILE_NAME):
+    # every column is read as raw text and factorized, so each distinct time, coordinate
+    # and name is parsed once instead of once per row
+    frame = pd.read_csv(file_name, usecols=list(CSV_COLUMNS), dtype=object, keep_default_na=False, encoding='utf-8')
+    factorized = {name: pd.factorize(frame[name].to_numpy()) for name in CSV_COLUMNS}
+    del frame
+
+    def parsed(name, parse):
+        codes, uniques = factorized[name]
+        return np.asarray(parse(uniques), dtype=np.float64)[codes]
+
+    departure = parsed('departure_time', parse_seconds_array)
+    arrival = parsed('arrival_time', parse_seconds_array)
+    coords = {name: parsed(name, lambda uniques: [_checked_float(value) for value in uniques]) for name in CSV_COLUMNS[6:]}
+    start_valid = valid_coordinates(coords['start_stop_lat'], coords['start_stop_lon'])
+    end_valid = valid_coordinates(coords['end_stop_lat'], coords['end_stop_lon'])
+    names_valid = np.logical_and.reduce([
+        (factorized[name][1] != '')[factorized[name][0]] for name in ('company', 'line', 'start_stop', 'end_stop')
+    ])
+
+    times_valid = ~np.isnan(departure) & ~np.isnan(arrival)
+    coords_valid = start_valid & end_valid
+    # each rejected row is counted once, under the first check it fails
+    rejected = {
+        'time': int((~times_valid).sum()),
+        'coordinates': int((times_valid & ~coords_valid).sum()),
+        'missing_name': int((times_valid & coords_valid & ~names_valid).sum()),
+    }
+    keep = times_valid & coords_valid & names_valid
+
+    def renumbered(codes, uniques):
+        # ids in order of first appearance among the kept rows
+        new_codes, used = pd.factorize(codes)
+        return new_codes.astype(np.int32), [str(name) for name in uniques[used]]
+
+    # stops are numbered start stop before end stop of each row, as they are first met in the file
+    start_codes, start_names = factorized['start_stop']
+    end_codes, end_names = factorized['end_stop']
+    name_codes, names = pd.factorize(np.concatenate((start_names, end_names)))
+    interleaved = np.column_stack((name_codes[start_codes][keep], name_codes[len(start_names) + end_codes][keep])).ravel()
+    stop_codes, stops = renumbered(interleaved, names)
+    _, first_seen = np.unique(stop_codes, return_index=True)
+    lats = np.column_stack((coords['start_stop_lat'][keep], coords['end_stop_lat'][keep])).ravel()
+    lons = np.column_stack((coords['start_stop_lon'][keep], coords['end_stop_lon'][keep])).ravel()
+
+    line_codes, lines = renumbered(factorized['line'][0][keep], factorized['line'][1])
+    company_codes, companies = renumbered(factorized['company'][0][keep], factorized['company'][1])
+
+    arrays = {
+        'departure': departure[keep].astype(np.int32),
+        'arrival': arrival[keep].astype(np.int32),
+        'start_stop': stop_codes[0::2],
+        'end_stop': stop_codes[1::2],
+        'line': line_codes,
+        'company': company_codes,
+    }
+    order = np.argsort(arrays['departure'], kind='stable')
+    arrays = {name: values[order] for name, values in arrays.items()}
+    arrays['stop_lat'] = lats[first_seen]
+    arrays['stop_lon'] = lons[first_seen]
+
+    mtime_ns, size = os.stat(file_name).st_mtime_ns, os.path.getsize(file_name)
+    meta = {
+        'version': CACHE_VERSION,
+        'source_mtime_ns': mtime_ns,
+        'source_size': size,
+        'source_sha1': file_hash(file_name),
+        'connections': len(arrays['departure']),
+        'rejected_rows': sum(rejected.values()),
+        'rejected': rejected,
+        'stops': stops,
+        'lines': lines,
+        'companies': companies,
+    }
+
+    directory = cache_dir(file_name)
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), values)
+
+    # meta.json is written last, so a half-written cache is never picked up
+    _write_meta(file_name, meta)
+    return meta
+
+
+
+def _write_meta(file_name, meta):
+    directory = cache_dir(file_name)
+    tmp_path = os.path.join(directory, 'meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+
+
+def _read_meta(file_name):
+    meta_path = os.path.join(cache_dir(file_name), 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+
+def cache_is_fresh(file_name=FILE_NAME, meta=None):
+    if meta is None:
+        meta = _read_meta(file_name)
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return False
+
+    stat = os.stat(file_name)
+    if stat.st_size != meta['source_size']:
+        return False
+    if stat.st_mtime_ns == meta['source_mtime_ns']:
+        return True
+
+    # touched or copied but unchanged - fall back to the content hash
+    if file_hash(file_name) != meta['source_sha1']:
+        return False
+
+    meta['source_mtime_ns'] = stat.st_mtime_ns
+    _write_meta(file_name, meta)
+    return True
+
+
+
+def load_compiled(file_name=FILE_NAME, mmap=True):
+    meta = _read_meta(file_name)
+    if not cache_is_fresh(file_name, meta):
+        meta = compile_timetable(file_name)
+
+    directory = cache_dir(file_name)
+    mmap_mode = 'r' if mmap else None
+    compiled = {'meta': meta, 'stops': meta['stops'], 'lines': meta['lines'], 'companies': meta['companies']}
+    for name in TIME_COLUMNS + ID_COLUMNS + STOP_COLUMNS:
+        compiled[name] = np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+    return compiled
+
+
+
+def slice_compiled(compiled, start_sec, end_sec):
+    # the cache is sorted by departure, so a window is one contiguous range of every column
+    # and only that range of the memory maps is ever read
+    lo = int(np.searchsorted(compiled['departure'], start_sec, side='left'))
+    hi = int(np.searchsorted(compiled['departure'], end_sec, side='right'))
+    sliced = dict(compiled)
+    for name in TIME_COLUMNS + ID_COLUMNS:
+        sliced[name] = compiled[name][lo:hi]
+    sliced['window'] = (start_sec, end_sec)
+    return sliced
+
+
+
+def load_timetable(file_name=FILE_NAME, start_time=None, horizon=TIMETABLE_HORIZON):
+    compiled = load_compiled(file_name)
+    if start_time is None:
+        return Timetable(compiled)
+
+    start_sec = int((start_time - BASE_DATE).total_seconds())
+    return Timetable(slice_compiled(compiled, start_sec, start_sec + int(horizon.total_seconds())))
+
+
+
+class TimetableStore:
+    # timetables for fixed time slices, built on first use and kept in an LRU,
+    # the one for a slice covers every query starting in it up to the horizon
+    def __init__(self, file_name=FILE_NAME, horizon=TIMETABLE_HORIZON, slice_size=TIMETABLE_SLICE, max_slices=4):
+        self.compiled = load_compiled(file_name)
+        self.horizon_sec = int(horizon.total_seconds())
+        self.slice_sec = int(slice_size.total_seconds())
+        self.max_slices = max_slices
+        self.timetables = OrderedDict()
+
+
+    def get(self, start_time):
+        start_sec = int((start_time - BASE_DATE).total_seconds())
+        slice_start = start_sec // self.slice_sec * self.slice_sec
+
+        if slice_start in self.timetables:
+            self.timetables.move_to_end(slice_start)
+            return self.timetables[slice_start]
+
+        window_end = slice_start + self.slice_sec + self.horizon_sec
+        timetable = Timetable(slice_compiled(self.compiled, slice_start, window_end))
+        self.timetables[slice_start] = timetable
+        if len(self.timetables) > self.max_slices:
+            self.timetables.popitem(last=False)
+        return timetable
+
+
+    def clear(self):
+        self.timetables.clear()
+
+
+
 def load_weighted_graph(criterion):
     if criterion not in ["time", "t", "change", "c"]:
         raise ValueError("wrong criterion")
 
-    graph = {}
-    with open(FILE_NAME, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-
-        for row in reader:
-            try:
-                row['departure_time'] = parse_extended_time(row['departure_time'])
-                row['arrival_time'] = parse_extended_time(row['arrival_time'])
-                row['start_stop_lat'] = float(row['start_stop_lat'])
-                row['start_stop_lon'] = float(row['start_stop_lon'])
-                row['end_stop_lat'] = float(row['end_stop_lat'])
-                row['end_stop_lon'] = float(row['end_stop_lon'])
-            except Exception as e:
-                continue  
-
-            if criterion in ['time', 't']:
-                row['weight'] = (row['arrival_time'] - row['departure_time']).total_seconds
-            elif criterion in ['change', 'c']:
-                row['weight'] = 0
-
-            start = row['start_stop']
-            if start not in graph:
-                graph[start] = []
-            graph[start].append(row)
-    
-    return graph
\ No newline at end of file
+    return load_timetable()
\ No newline at end of file
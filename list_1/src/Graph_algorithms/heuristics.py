@@ -0,0 +1,135 @@
+import heapq
+import numpy as np
+from src.Config.constants import TIME_COST_PER_SEC
+from src.Graph_algorithms.a_star import haversine_array
+
+
+
+LANDMARK_COUNT = 8
+
+
+
+def max_network_speed(timetable):
+    # fastest straight-line speed of any connection in m/s; a zero-duration hop between
+    # two different places makes every distance bound worthless, so it gives inf
+    distance = haversine_array(
+        timetable.stop_lat[timetable.start_stop], timetable.stop_lon[timetable.start_stop],
+        timetable.stop_lat[timetable.end_stop], timetable.stop_lon[timetable.end_stop]
+    )
+    duration = (timetable.arrival - timetable.departure).astype(np.float64)
+    moving = distance > 0
+    if not moving.any():
+        return 0.0
+    if (duration[moving] <= 0).any():
+        return float('inf')
+    return float((distance[moving] / duration[moving]).max())
+
+
+
+def footpath_speed(timetable, footpaths):
+    source, target = footpaths.source, footpaths.target
+    distance = haversine_array(
+        timetable.stop_lat[source], timetable.stop_lon[source], timetable.stop_lat[target], timetable.stop_lon[target]
+    )
+    return float((distance / footpaths.duration).max()) if len(footpaths) else 0.0
+
+
+
+def min_duration_graph(timetable, reverse=False, footpaths=None):
+    # static graph of the timetable, each stop pair weighted by its fastest connection or walk
+    start, end = timetable.start_stop, timetable.end_stop
+    duration = (timetable.arrival - timetable.departure).astype(np.int64)
+    if footpaths is not None:
+        start = np.concatenate((start, footpaths.source))
+        end = np.concatenate((end, footpaths.target))
+        duration = np.concatenate((duration, footpaths.duration.astype(np.int64)))
+    if reverse:
+        start, end = end, start
+    n = len(timetable.stops)
+    key = start.astype(np.int64) * n + end
+    order = np.lexsort((duration, key))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = key[order][1:] != key[order][:-1]
+    pairs = order[first]
+
+    adjacency = [[] for _ in range(n)]
+    for u, v, w in zip(start[pairs].tolist(), end[pairs].tolist(), duration[pairs].tolist()):
+        adjacency[u].append((v, w))
+    return adjacency
+
+
+
+def static_distances(adjacency, source):
+    distance = [float('inf')] * len(adjacency)
+    distance[source] = 0
+    queue = [(0, source)]
+    while queue:
+        d, u = heapq.heappop(queue)
+        if d > distance[u]:
+            continue
+        for v, w in adjacency[u]:
+            if d + w < distance[v]:
+                distance[v] = d + w
+                heapq.heappush(queue, (d + w, v))
+    return np.array(distance, dtype=np.float64)
+
+
+
+def choose_landmarks(timetable, count):
+    # farthest-point selection on the map, starting from the stop farthest from the centre
+    lat, lon = timetable.stop_lat, timetable.stop_lon
+    if count <= 0 or len(lat) == 0:
+        return []
+    nearest = haversine_array(lat, lon, lat.mean(), lon.mean())
+    landmarks = []
+    for _ in range(min(count, len(lat))):
+        landmark = int(np.argmax(nearest))
+        landmarks.append(landmark)
+        nearest = np.minimum(nearest, haversine_array(lat, lon, lat[landmark], lon[landmark]))
+    return landmarks
+
+
+
+class HeuristicTable:
+    # admissible lower bounds on the remaining travel time to a target, one array entry per stop
+    def __init__(self, timetable, landmarks=LANDMARK_COUNT, footpaths=None):
+        # searches that walk need a table built with the same footpaths to stay admissible
+        self.timetable = timetable
+        self.max_speed = max_network_speed(timetable)
+        if footpaths is not None:
+            self.max_speed = max(self.max_speed, footpath_speed(timetable, footpaths))
+        if isinstance(landmarks, int):
+            landmarks = choose_landmarks(timetable, landmarks)
+        self.landmarks = [timetable.stop_id(stop) if isinstance(stop, str) else stop for stop in landmarks]
+
+        # ALT: from_landmark[k, v] and to_landmark[k, v] bound the travel time landmark k -> v and v -> landmark k
+        forward = min_duration_graph(timetable, footpaths=footpaths)
+        backward = min_duration_graph(timetable, reverse=True, footpaths=footpaths)
+        n = len(timetable.stops)
+        self.from_landmark = np.array([static_distances(forward, l) for l in self.landmarks]).reshape(-1, n)
+        self.to_landmark = np.array([static_distances(backward, l) for l in self.landmarks]).reshape(-1, n)
+        self._target = None
+        self._bounds = None
+
+
+    def bounds(self, end_id):
+        timetable = self.timetable
+        distance = haversine_array(timetable.stop_lat, timetable.stop_lon, timetable.stop_lat[end_id], timetable.stop_lon[end_id])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bound = np.nan_to_num(distance / self.max_speed, nan=0.0) if self.max_speed else np.zeros(len(distance))
+            if len(self.landmarks):
+                # triangle inequality both ways round every landmark; inf - inf says nothing, so nan is dropped
+                via_to = self.to_landmark - self.to_landmark[:, [end_id]]
+                via_from = self.from_landmark[:, [end_id]] - self.from_landmark
+                alt = np.fmax(via_to, via_from)
+                alt = np.nanmax(np.where(np.isnan(alt), -np.inf, alt), axis=0)
+                bound = np.fmax(bound, alt)
+        return np.maximum(bound, 0) * TIME_COST_PER_SEC
+
+
+    def to(self, end_id):
+        # the last target is kept, so repeated queries to one stop cost a single lookup per node
+        if self._target != end_id:
+            self._bounds = self.bounds(end_id).tolist()
+            self._target = end_id
+        return self._bounds
\ No newline at end of file
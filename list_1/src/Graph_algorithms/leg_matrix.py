@@ -0,0 +1,104 @@
+import time
+from bisect import bisect_left
+from datetime import timedelta
+import numpy as np
+from src.Config.constants import TIME_COST_PER_SEC
+from src.Graph_algorithms.csa import csa_one_to_all, csa_path, csa_min_time
+
+
+
+LEG_MATRIX_HORIZON = timedelta(hours=3)
+
+
+
+class LegMatrix:
+    # time-dependent leg costs between the stops of a tour, usable as cost_func for the time criterion
+    def __init__(self, timetable, stops, start_time, horizon=LEG_MATRIX_HORIZON, fallback=csa_min_time):
+        t0 = time.time()
+        self.timetable = timetable
+        self.stops = [stop for stop in dict.fromkeys(stops) if timetable.stop_id(stop) is not None]
+        self.fallback = fallback
+        self.window_start = timetable.to_seconds(start_time)
+        self.window_end = timetable.to_seconds(start_time + horizon)
+        # profiles[(from_id, to_id)] is (departures, arrivals, paths), departures and arrivals both increasing
+        self.profiles = {}
+        self.last_departure = {}
+
+        stop_ids = [timetable.stop_id(stop) for stop in self.stops]
+        for stop_id in stop_ids:
+            self._build_profiles(stop_id, stop_ids)
+
+        self.build_time = time.time() - t0
+
+
+    def _build_profiles(self, from_id, stop_ids):
+        timetable = self.timetable
+        targets = [stop_id for stop_id in stop_ids if stop_id != from_id]
+        outgoing = timetable.departure[timetable.offsets[from_id]:timetable.offsets[from_id + 1]]
+        lo = np.searchsorted(outgoing, self.window_start, side='left')
+        hi = np.searchsorted(outgoing, self.window_end, side='right')
+        departures = np.unique(outgoing[lo:hi])
+        self.last_departure[from_id] = int(departures[-1]) if len(departures) else self.window_start - 1
+
+        profiles = {to_id: ([], [], []) for to_id in targets}
+        # latest departure first, an earlier one is only kept if it really arrives earlier
+        for departure in departures[::-1].tolist():
+            stop_arrival, stop_conn, boarded_from = csa_one_to_all(timetable, from_id, departure, targets)
+            for to_id in targets:
+                arrival = stop_arrival.get(to_id)
+                if arrival is None:
+                    continue
+                profile_departures, profile_arrivals, paths = profiles[to_id]
+                if profile_arrivals and arrival >= profile_arrivals[-1]:
+                    continue
+                profile_departures.append(departure)
+                profile_arrivals.append(arrival)
+                paths.append(tuple(csa_path(stop_conn, boarded_from, to_id)))
+
+        for to_id, (profile_departures, profile_arrivals, paths) in profiles.items():
+            self.profiles[(from_id, to_id)] = (profile_departures[::-1], profile_arrivals[::-1], paths[::-1])
+
+
+    def lookup(self, from_stop, to_stop, departure_sec):
+        # (arrival, connections) of the earliest arrival leaving at departure_sec or later,
+        # None when the answer is not in the matrix and False when the stop cannot be reached
+        from_id = self.timetable.stop_id(from_stop)
+        to_id = self.timetable.stop_id(to_stop)
+        profile = self.profiles.get((from_id, to_id))
+        if profile is None or departure_sec < self.window_start:
+            return None
+
+        departures, arrivals, paths = profile
+        pos = bisect_left(departures, departure_sec)
+        if pos < len(departures):
+            return arrivals[pos], paths[pos]
+        if departure_sec <= self.last_departure[from_id]:
+            return False
+        return None
+
+
+    def arrival(self, from_stop, to_stop, departure_time):
+        departure_sec = self.timetable.to_seconds(departure_time)
+        found = self.lookup(from_stop, to_stop, departure_sec)
+        if found is None:
+            cost, path, _ = self.fallback(self.timetable, from_stop, to_stop, departure_time)
+            return path[-1]['arrival_time'] if path else None
+        if found is False:
+            return None
+        return self.timetable.to_datetime(found[0])
+
+
+    def __call__(self, graph, from_stop, to_stop, departure_time):
+        departure_sec = self.timetable.to_seconds(departure_time)
+        found = self.lookup(from_stop, to_stop, departure_sec)
+        if found is None:
+            return self.fallback(self.timetable, from_stop, to_stop, departure_time)
+        if found is False:
+            return None, None, 0.0
+
+        arrival, conns = found
+        return (arrival - departure_sec) * TIME_COST_PER_SEC, self.timetable.path(conns), 0.0
+
+
+    def __len__(self):
+        return sum(len(departures) for departures, _, _ in self.profiles.values())
\ No newline at end of file
@@ -0,0 +1,181 @@
+import heapq, time, weakref
+from bisect import bisect_left
+from src.Config.constants import MIN_CHANGE_SEC, TIME_COST_PER_SEC, CHANGE_COST_PER_CHANGE
+
+
+
+MAX_ROUNDS = 8
+_line_indexes = weakref.WeakKeyDictionary()
+
+
+
+class LineIndex:
+    # the timetable's edges regrouped for route scans, as plain lists so the scans never touch NumPy scalars:
+    # edges[(stop, line)] lists (end stop, first, last) position ranges into departure and best
+    def __init__(self, timetable):
+        self.departure = timetable.edge_departure.tolist()
+        self.best = timetable.edge_best.tolist()
+        self.arrival = timetable.arrival.tolist()
+        self.line = timetable.line.tolist()
+        self.edges = {}
+        self.lines = [[] for _ in timetable.stops]
+
+        edge_offsets = timetable.edge_offsets.tolist()
+        conn_offsets = timetable.edge_conn_offsets.tolist()
+        edge_line, edge_end = timetable.edge_line.tolist(), timetable.edge_end.tolist()
+        for stop in range(len(timetable.stops)):
+            for edge in range(edge_offsets[stop], edge_offsets[stop + 1]):
+                key = (stop, edge_line[edge])
+                if key not in self.edges:
+                    self.edges[key] = []
+                    self.lines[stop].append(edge_line[edge])
+                self.edges[key].append((edge_end[edge], conn_offsets[edge], conn_offsets[edge + 1]))
+
+
+
+def line_index(timetable):
+    # built once per timetable and dropped with it
+    index = _line_indexes.get(timetable)
+    if index is None:
+        index = _line_indexes[timetable] = LineIndex(timetable)
+    return index
+
+
+
+def _scan_line(index, line, round_index, ready, horizon, left):
+    # route scan: follow the line's edges from every stop it can be boarded at; riding the line
+    # needs no change time, so each stop only has to be left once, at its earliest arrival;
+    # left[stop] is when an earlier round already left stop on this line, and anything leaving
+    # no sooner with more boardings is dominated, so it is not scanned again
+    edges, departure, best, arrival = index.edges, index.departure, index.best, index.arrival
+    inf = float('inf')
+    on_line = {}
+    boarded_from = {}
+    leave = dict(ready)
+    queue = [(ready_time, stop) for stop, (ready_time, previous) in ready.items() if ready_time < left.get(stop, inf)]
+    heapq.heapify(queue)
+
+    while queue:
+        current_time, stop = heapq.heappop(queue)
+        if leave[stop][0] != current_time or left.get(stop, inf) <= current_time:
+            continue
+        left[stop] = current_time
+        previous = leave[stop][1]
+
+        for end, lo, hi in edges.get((stop, line), ()):
+            pos = bisect_left(departure, current_time, lo, hi)
+            if pos == hi:
+                continue
+
+            conn = best[pos]
+            arr = arrival[conn]
+            if arr >= horizon or (end in on_line and arr >= on_line[end][0]):
+                continue
+
+            on_line[end] = (arr, conn)
+            boarded_from[conn] = previous
+            if end not in leave or arr < leave[end][0]:
+                leave[end] = (arr, (round_index, conn))
+                heapq.heappush(queue, (arr, end))
+
+    return on_line, boarded_from
+
+
+
+def raptor_pareto(timetable, start_stop, end_stop, start_time, max_rounds=MAX_ROUNDS):
+    # the (time, changes) Pareto router: it answers the change criterion and both criteria in one query;
+    # for the earliest arrival alone csa_min_time scans faster, as no change counts are kept
+    t0 = time.time()
+    start_id = timetable.stop_id(start_stop)
+    end_id = timetable.stop_id(end_stop)
+
+    if start_id is None or end_id is None:
+        run_time = time.time() - t0
+        return [], run_time
+
+    start_sec = timetable.start_seconds(start_time)
+
+    if start_id == end_id:
+        run_time = time.time() - t0
+        return [(0, 0, [])], run_time
+
+    inf = float('inf')
+    index = line_index(timetable)
+    line_of = index.line
+    # labels[k][stop] = (arrival, connection) of the best journey found in round k;
+    # parents[k][connection] = (round, connection) it was boarded from, None at the origin
+    labels = [{start_id: (start_sec, None)}]
+    parents = [{}]
+    best = {start_id: start_sec}
+    marked = {start_id}
+    # line -> stop -> earliest time the line was left from stop in any round so far
+    left = {}
+
+    for k in range(1, max_rounds + 1):
+        previous = labels[k - 1]
+        horizon = best.get(end_id, inf)
+        round_labels = {}
+        round_parents = {}
+
+        ready_by_line = {}
+        for stop in marked:
+            arrival, conn = previous[stop]
+            parent = None if conn is None else (k - 1, conn)
+            for line in index.lines[stop]:
+                ready = arrival
+                if conn is not None and line_of[conn] != line:
+                    ready += MIN_CHANGE_SEC
+                ready_by_line.setdefault(line, {})[stop] = (ready, parent)
+
+        for line, ready in ready_by_line.items():
+            on_line, boarded_from = _scan_line(index, line, k, ready, horizon, left.setdefault(line, {}))
+            round_parents.update(boarded_from)
+
+            for stop, (arrival, conn) in on_line.items():
+                if arrival < best.get(stop, inf) and arrival < best.get(end_id, inf):
+                    best[stop] = arrival
+                    round_labels[stop] = (arrival, conn)
+
+        labels.append(round_labels)
+        parents.append(round_parents)
+        marked = set(round_labels)
+        if not marked:
+            break
+
+    journeys = []
+    for k in range(1, len(labels)):
+        if end_id not in labels[k]:
+            continue
+
+        arrival, conn = labels[k][end_id]
+        path = []
+        step = (k, conn)
+        while step is not None:
+            path.append(step[1])
+            step = parents[step[0]][step[1]]
+        path.reverse()
+        journeys.append(((arrival - start_sec) * TIME_COST_PER_SEC, k - 1, timetable.path(path)))
+
+    run_time = time.time() - t0
+    return journeys, run_time
+
+
+
+def raptor_min_time(timetable, start_stop, end_stop, start_time, max_rounds=MAX_ROUNDS):
+    # the fastest end of the front, for callers already using RAPTOR; time-only queries belong to csa_min_time
+    journeys, run_time = raptor_pareto(timetable, start_stop, end_stop, start_time, max_rounds)
+    if not journeys:
+        return None, None, run_time
+
+    cost, changes, path = journeys[-1]
+    return cost, path, run_time
+
+
+
+def raptor_min_changes(timetable, start_stop, end_stop, start_time, max_rounds=MAX_ROUNDS):
+    journeys, run_time = raptor_pareto(timetable, start_stop, end_stop, start_time, max_rounds)
+    if not journeys:
+        return None, None, run_time
+
+    cost, changes, path = journeys[0]
+    return changes * CHANGE_COST_PER_CHANGE, path, run_time
\ No newline at end of file
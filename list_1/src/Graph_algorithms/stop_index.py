@@ -0,0 +1,153 @@
+import math
+import numpy as np
+from src.Config.constants import FILE_NAME, WALKING_SPEED
+from src.Graph_algorithms.graph_loader import load_compiled
+from src.Graph_algorithms.a_star import haversine_array
+
+
+
+EARTH_RADIUS = 6371000
+GRID_CELL = 500
+# batch queries are grouped by blocks of QUERY_BLOCK x QUERY_BLOCK cells
+QUERY_BLOCK = 4
+
+
+
+class StopIndex:
+    # stop coordinates as arrays plus a uniform grid over a local flat projection, in meters
+    def __init__(self, names, lat, lon, cell_size=GRID_CELL):
+        self.names = list(names)
+        self.stop_index = {name: stop_id for stop_id, name in enumerate(self.names)}
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_size = cell_size
+
+        # x is scaled with the largest |lat| in the network, so projected distances never exceed true ones
+        self.lon_scale = math.cos(math.radians(np.abs(self.lat).max())) if len(self.lat) else 1.0
+        cell_x, cell_y = self._cells(self.lat, self.lon)
+        order = np.lexsort((cell_y, cell_x))
+        self.order = order
+        keys = np.column_stack((cell_x[order], cell_y[order]))
+        new_cell = np.ones(len(order), dtype=bool)
+        new_cell[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        starts = np.flatnonzero(new_cell)
+        ends = np.append(starts[1:], len(order))
+        self.cells = {(int(keys[s, 0]), int(keys[s, 1])): (int(s), int(e)) for s, e in zip(starts, ends)}
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def _cells(self, lat, lon):
+        x = EARTH_RADIUS * np.radians(lon) * self.lon_scale
+        y = EARTH_RADIUS * np.radians(lat)
+        return np.floor(x / self.cell_size).astype(np.int64), np.floor(y / self.cell_size).astype(np.int64)
+
+
+    def coords(self, stop):
+        stop_id = self.stop_index[stop] if isinstance(stop, str) else stop
+        return float(self.lat[stop_id]), float(self.lon[stop_id])
+
+
+    def distances(self, lat, lon, stop_ids=None):
+        if stop_ids is None:
+            return haversine_array(self.lat, self.lon, lat, lon)
+        return haversine_array(self.lat[stop_ids], self.lon[stop_ids], lat, lon)
+
+
+    def _candidates(self, bx, by, rings):
+        # stops in the cells of block (bx, by) and the rings of cells around it
+        x0, y0 = bx * QUERY_BLOCK - rings, by * QUERY_BLOCK - rings
+        side = QUERY_BLOCK + 2 * rings
+        if side * side > len(self.cells):
+            return np.arange(len(self.names))
+        ranges = [
+            self.cells[(x, y)]
+            for x in range(x0, x0 + side) for y in range(y0, y0 + side)
+            if (x, y) in self.cells
+        ]
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.order[s:e] for s, e in ranges])
+
+
+    def _query_blocks(self, lats, lons):
+        # query points grouped by block, so candidates are gathered once per block rather than per point
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        cell_x, cell_y = self._cells(lats, lons)
+        keys, inverse = np.unique(np.column_stack((cell_x // QUERY_BLOCK, cell_y // QUERY_BLOCK)), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        rows = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[rows], np.arange(len(keys) + 1))
+        for key, lo, hi in zip(keys.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+            yield key[0], key[1], rows[lo:hi], lats, lons
+
+
+    def radius(self, lat, lon, radius):
+        # stops within radius meters as (stop_ids, distances), nearest first
+        return self.radius_many([lat], [lon], radius)[0]
+
+
+    def nearest(self, lat, lon, k=1):
+        # the k nearest stops as (stop_ids, distances)
+        return self.nearest_many([lat], [lon], k)[0]
+
+
+    def radius_many(self, lats, lons, radius):
+        rings = int(math.ceil(radius / self.cell_size)) + 1
+        results = [None] * len(np.atleast_1d(lats))
+
+        for bx, by, rows, lats, lons in self._query_blocks(lats, lons):
+            candidates = self._candidates(bx, by, rings)
+            distance = haversine_array(self.lat[candidates], self.lon[candidates], lats[rows, None], lons[rows, None])
+            for row, row_distance in zip(rows.tolist(), distance):
+                inside = np.flatnonzero(row_distance <= radius)
+                order = inside[np.argsort(row_distance[inside], kind='stable')]
+                results[row] = (candidates[order], row_distance[order])
+
+        return results
+
+
+    def nearest_many(self, lats, lons, k=1):
+        k = min(k, len(self.names))
+        results = [None] * len(np.atleast_1d(lats))
+
+        for bx, by, rows, lats, lons in self._query_blocks(lats, lons):
+            rings = 1
+            # rings grow until the k-th nearest stop lies within the searched rings
+            while len(rows):
+                candidates = self._candidates(bx, by, rings)
+                searched_all = len(candidates) == len(self.names)
+                if len(candidates) < k and not searched_all:
+                    rings *= 2
+                    continue
+
+                distance = haversine_array(self.lat[candidates], self.lon[candidates], lats[rows, None], lons[rows, None])
+                order = np.argsort(distance, axis=1, kind='stable')[:, :k]
+                nearest = np.take_along_axis(distance, order, axis=1)
+                done = np.full(len(rows), True) if searched_all or k == 0 else nearest[:, -1] <= (rings - 1) * self.cell_size
+                for row, row_order, row_nearest in zip(rows[done].tolist(), order[done], nearest[done]):
+                    results[row] = (candidates[row_order], row_nearest)
+                rows = rows[~done]
+                rings *= 2
+
+        return results
+
+
+    def access_stops(self, lat, lon, radius, walking_speed=WALKING_SPEED):
+        # (stop name, walking seconds) around a point, ready to seed a multi-source search
+        stop_ids, distance = self.radius(lat, lon, radius)
+        return [(self.names[stop_id], seconds) for stop_id, seconds in zip(stop_ids.tolist(), (distance / walking_speed).tolist())]
+
+
+
+def stop_index_from_timetable(timetable, cell_size=GRID_CELL):
+    return StopIndex(timetable.stops, timetable.stop_lat, timetable.stop_lon, cell_size)
+
+
+
+def load_stop_index(file_name=FILE_NAME, cell_size=GRID_CELL):
+    compiled = load_compiled(file_name)
+    return StopIndex(compiled['stops'], compiled['stop_lat'], compiled['stop_lon'], cell_size)
\ No newline at end of file
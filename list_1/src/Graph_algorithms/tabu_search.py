@@ -1,18 +1,105 @@
 import random
 import time
-from src.Config.constants import MIN_CHANGE_TIME, CHANGE_COST_PER_CHANGE, TIME_COST_PER_SEC
-from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+from src.Config.constants import MIN_CHANGE_TIME, CHANGE_COST_PER_CHANGE, TIME_COST_PER_SEC, BASE_DATE
+from src.Utilities.process_pool import fork_pool
+from collections import deque, OrderedDict
 
 
 
-def calculate_route_cost(initial_time, start_stop, route, graph, cost_func, criterion):
-    total_cost = 0.0
-    segments = []
-    current_stop = start_stop
-    current_time = initial_time
-    previous_line = None  
+SEGMENT_CACHE_SIZE = 100_000
+
+
+
+class SegmentCache:
+    def __init__(self, cost_func, criterion, maxsize=SEGMENT_CACHE_SIZE, bucket_sec=None, deadline=None):
+        self.cost_func = cost_func
+        self.criterion = criterion
+        self.maxsize = maxsize
+        self.bucket_sec = bucket_sec
+        # time.time() after which every leg lookup raises TimeoutError, so a search cannot overrun it
+        self.deadline = deadline
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __call__(self, graph, from_stop, to_stop, departure_time):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise TimeoutError("deadline passed")
+
+        # every departure is a multiple of the bucket, so searching from the next bucket
+        # boundary finds the same connections as searching from departure_time itself
+        bucket_sec = self.bucket_sec or getattr(graph, 'time_resolution', 1)
+        seconds = (departure_time - BASE_DATE).total_seconds()
+        bucket_time = BASE_DATE + timedelta(seconds=-(-seconds // bucket_sec) * bucket_sec)
+        key = (from_stop, to_stop, bucket_time, self.criterion)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            cost, path = self.entries[key]
+        else:
+            self.misses += 1
+            cost, path, _ = self.cost_func(graph, from_stop, to_stop, bucket_time)
+            self.entries[key] = (cost, path)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        if cost is not None and self.criterion in ["time", "t"]:
+            cost += (bucket_time - departure_time).total_seconds() * TIME_COST_PER_SEC
+
+        return cost, path, 0.0
+
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+
+def segment_cache(cost_func, criterion, cache=None):
+    if cache is not None:
+        return cache
+    return SegmentCache(cost_func, criterion)
+
+
+
+def _cache_counters(cost_func):
+    return getattr(cost_func, 'hits', 0), getattr(cost_func, 'misses', 0)
+
+
+
+def _evaluated(moves, tabu_list, aspiration_cost):
+    # moves evaluate_neighborhood scores, whether kept or not; tabu moves are skipped unless aspiration may readmit them
+    if aspiration_cost is not None:
+        return len(moves)
+    return sum(move not in tabu_list for move in moves)
+
+
+
+def _report_stats(stats, cost_func, cache_start, iterations, neighbors):
+    # with workers > 1 the workers' cache lookups stay in their processes, only the parent's are counted
+    hits, misses = _cache_counters(cost_func)
+    stats.update(iterations=iterations, neighbors=neighbors, cache_hits=hits - cache_start[0], cache_misses=misses - cache_start[1])
+
+
+
+def _run_legs(graph, cost_func, criterion, state, targets, cost_bound=float('inf'), states=None, segments=None):
+    current_stop, current_time, previous_line, total_cost = state
+    if segments is None:
+        segments = []
+
+    for next_stop in targets:
+        if states is not None:
+            states.append((current_stop, current_time, previous_line, total_cost))
 
-    for next_stop in route + [start_stop]:
         segment_cost, segment_path, _ = cost_func(graph, current_stop, next_stop, current_time)
 
         if segment_cost is None or segment_path is None or len(segment_path) == 0:
@@ -35,6 +122,10 @@ def calculate_route_cost(initial_time, start_stop, route, graph, cost_func, crit
         elif criterion in ["change", "c"]:
             total_cost += change_cost + segment_cost
 
+        # costs never decrease along the route, so this tour cannot beat the bound anymore
+        if total_cost > cost_bound:
+            return float('inf'), None
+
         segments.append((current_stop, next_stop, segment_path))
         current_time = segment_path[-1]['arrival_time']
         previous_line = segment_path[-1]['line']
@@ -44,152 +135,295 @@ def calculate_route_cost(initial_time, start_stop, route, graph, cost_func, crit
 
 
 
-def tabu_search_route(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000):
+def calculate_route_cost(initial_time, start_stop, route, graph, cost_func, criterion):
+    return _run_legs(graph, cost_func, criterion, (start_stop, initial_time, None, 0.0), route + [start_stop])
+
+
+
+def calculate_route_states(initial_time, start_stop, route, graph, cost_func, criterion):
+    # states[k] is (stop, time, last line, cost so far) right before leg k of the route;
+    # segments keeps the legs found so far even when the route turns out infeasible
+    states = []
+    segments = []
+    total_cost, _ = _run_legs(
+        graph, cost_func, criterion, (start_stop, initial_time, None, 0.0), route + [start_stop],
+        states=states, segments=segments
+    )
+    return total_cost, segments, states
+
+
+
+def evaluate_swap(start_stop, neighbor, i, states, segments, graph, cost_func, criterion, cost_bound=float('inf')):
+    # legs before position i are the same as in the current solution, so only the tail is searched
+    if i >= len(states):
+        return float('inf'), None
+
+    total_cost, tail_segments = _run_legs(
+        graph, cost_func, criterion, states[i], neighbor[i:] + [start_stop], cost_bound
+    )
+    if tail_segments is None:
+        return float('inf'), None
+
+    return total_cost, segments[:i] + tail_segments
+
+
+
+_worker_context = None
+
+
+
+def _init_worker(context):
+    # under fork the context is inherited, not pickled, so every worker reads the parent's timetable
+    global _worker_context
+    _worker_context = context
+
+
+
+def _evaluate_moves(context, current_solution, states, current_segments, moves, tabu_list, aspiration_cost):
+    start_stop, graph, cost_func, criterion = context
+    neighborhood = []
+    cost_bound = float('inf')
+
+    for move in moves:
+        if move in tabu_list and aspiration_cost is None:
+            continue
+
+        i, j = move
+        neighbor = current_solution[:]
+        neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+        cost, segments = evaluate_swap(start_stop, neighbor, i, states, current_segments, graph, cost_func, criterion, cost_bound)
+
+        if move in tabu_list and cost >= aspiration_cost:
+            continue
+
+        neighborhood.append((cost, neighbor, segments, move))
+        cost_bound = min(cost_bound, cost)
+
+    return neighborhood
+
+
+
+def _evaluate_chunk(current_solution, states, current_segments, indexed_moves, tabu_list, aspiration_cost):
+    positions = {move: k for k, move in indexed_moves}
+    moves = [move for _, move in indexed_moves]
+    neighborhood = _evaluate_moves(_worker_context, current_solution, states, current_segments, moves, tabu_list, aspiration_cost)
+    return [(positions[move], cost) for cost, _, _, move in neighborhood]
+
+
+
+@contextmanager
+def neighborhood_pool(workers, start_stop, graph, cost_func, criterion):
+    if workers is None or workers <= 1:
+        yield None
+        return
+
+    context = (start_stop, graph, cost_func, criterion)
+
+    with fork_pool(workers, _init_worker, (context,)) as pool:
+        yield pool
+
+
+
+def evaluate_neighborhood(initial_time, start_stop, current_solution, moves, tabu_list, graph, cost_func, criterion,
+                          aspiration_cost=None, pool=None, workers=1):
+    _, current_segments, states = calculate_route_states(initial_time, start_stop, current_solution, graph, cost_func, criterion)
+    context = (start_stop, graph, cost_func, criterion)
+
+    if pool is None:
+        return _evaluate_moves(context, current_solution, states, current_segments, moves, tabu_list, aspiration_cost)
+
+    # moves are dealt round robin so every worker gets a mix of long and short tails,
+    # and the results are put back in move order so ties break exactly as in the serial loop
+    tabu_moves = set(tabu_list)
+    indexed_moves = list(enumerate(moves))
+    futures = [
+        pool.submit(_evaluate_chunk, current_solution, states, current_segments, indexed_moves[k::workers], tabu_moves, aspiration_cost)
+        for k in range(min(workers, len(indexed_moves)))
+    ]
+    results = sorted(result for future in futures for result in future.result())
+
+    neighborhood = []
+    for position, cost in results:
+        i, j = move = moves[position]
+        neighbor = current_solution[:]
+        neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+        neighborhood.append((cost, neighbor, None, move))
+
+    # segments only travel back for the move that will actually be taken
+    if neighborhood:
+        best = min(range(len(neighborhood)), key=lambda k: neighborhood[k][0])
+        cost, neighbor, _, move = neighborhood[best]
+        _, segments = evaluate_swap(start_stop, neighbor, move[0], states, current_segments, graph, cost_func, criterion)
+        neighborhood[best] = (cost, neighbor, segments, move)
+
+    return neighborhood
+
+
+
+def tabu_search_route(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000, cache=None,
+                      workers=1, seed=None, stats=None):
     t0 = time.time()
 
     if criterion not in ["time", "t", "change", "c"]:
         raise ValueError("wrong criterion")
     
+    cost_func = segment_cache(cost_func, criterion, cache)
+    cache_start = _cache_counters(cost_func)
+    rng = random.Random(seed) if seed is not None else random
     current_solution = stops[:]
-    random.shuffle(current_solution)
+    rng.shuffle(current_solution)
     
     best_cost, best_segments = calculate_route_cost(initial_time, start_stop, current_solution, graph, cost_func, criterion)
     best_solution = current_solution[:]
     tabu_list = set()
 
-    for it in range(iterations):
-        neighborhood = []
-        n = len(current_solution)
-
-        for i in range(n):
-            for j in range(i + 1, n):
-                neighbor = current_solution[:]
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                move = (i, j)
-                if move in tabu_list:
-                    continue
-                cost, segments = calculate_route_cost(initial_time, start_stop, neighbor, graph, cost_func, criterion)
-                neighborhood.append((cost, neighbor, segments, move))
+    steps = neighbors = 0
+
+    with neighborhood_pool(workers, start_stop, graph, cost_func, criterion) as pool:
+        for it in range(iterations):
+            n = len(current_solution)
+            moves = [(i, j) for i in range(n) for j in range(i + 1, n)]
+            neighborhood = evaluate_neighborhood(
+                initial_time, start_stop, current_solution, moves, tabu_list, graph, cost_func, criterion,
+                pool=pool, workers=workers
+            )
+            neighbors += _evaluated(moves, tabu_list, None)
         
-        if not neighborhood:
-            break
+            if not neighborhood:
+                break
+            steps += 1
         
-        neighborhood.sort(key=lambda x: x[0])
-        best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
-        current_solution = best_neighbor
-        tabu_list.add(best_move)
+            neighborhood.sort(key=lambda x: x[0])
+            best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
+            current_solution = best_neighbor
+            tabu_list.add(best_move)
         
-        if best_neighbor_cost < best_cost:
-            best_cost = best_neighbor_cost
-            best_solution = best_neighbor[:]
-            best_segments = best_neighbor_segments
+            if best_neighbor_cost < best_cost:
+                best_cost = best_neighbor_cost
+                best_solution = best_neighbor[:]
+                best_segments = best_neighbor_segments
+
+    if stats is not None:
+        _report_stats(stats, cost_func, cache_start, steps, neighbors)
 
     run_time = time.time() - t0 
     return best_cost, best_solution, best_segments, run_time
 
 
 
-def tabu_search_route_dynamic_size(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000):
+def tabu_search_route_dynamic_size(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000, cache=None,
+                                   workers=1, seed=None, stats=None):
     t0 = time.time()
 
     max_tabu_size = len(stops) * 2  
     tabu_list = deque(maxlen=max_tabu_size)
 
+    cost_func = segment_cache(cost_func, criterion, cache)
+    cache_start = _cache_counters(cost_func)
+    rng = random.Random(seed) if seed is not None else random
     current_solution = stops[:]
-    random.shuffle(current_solution)
+    rng.shuffle(current_solution)
     
     best_cost, best_segments = calculate_route_cost(initial_time, start_stop, current_solution, graph, cost_func, criterion)
     best_solution = current_solution[:]
 
-    for it in range(iterations):
-        neighborhood = []
-        n = len(current_solution)
-
-        for i in range(n):
-            for j in range(i + 1, n):
-                neighbor = current_solution[:]
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                move = (i, j)
-
-                if move in tabu_list:
-                    continue
-
-                cost, segments = calculate_route_cost(initial_time, start_stop, neighbor, graph, cost_func, criterion)
-                neighborhood.append((cost, neighbor, segments, move))
+    steps = neighbors = 0
+
+    with neighborhood_pool(workers, start_stop, graph, cost_func, criterion) as pool:
+        for it in range(iterations):
+            n = len(current_solution)
+            moves = [(i, j) for i in range(n) for j in range(i + 1, n)]
+            neighborhood = evaluate_neighborhood(
+                initial_time, start_stop, current_solution, moves, tabu_list, graph, cost_func, criterion,
+                pool=pool, workers=workers
+            )
+            neighbors += _evaluated(moves, tabu_list, None)
         
-        if not neighborhood:
-            break
+            if not neighborhood:
+                break
+            steps += 1
         
-        neighborhood.sort(key=lambda x: x[0])
-        best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
-        current_solution = best_neighbor
-        tabu_list.append(best_move) 
+            neighborhood.sort(key=lambda x: x[0])
+            best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
+            current_solution = best_neighbor
+            tabu_list.append(best_move) 
         
-        if best_neighbor_cost < best_cost:
-            best_cost = best_neighbor_cost
-            best_solution = best_neighbor[:]
-            best_segments = best_neighbor_segments
+            if best_neighbor_cost < best_cost:
+                best_cost = best_neighbor_cost
+                best_solution = best_neighbor[:]
+                best_segments = best_neighbor_segments
+
+    if stats is not None:
+        _report_stats(stats, cost_func, cache_start, steps, neighbors)
 
     run_time = time.time() - t0 
     return best_cost, best_solution, best_segments, run_time
 
 
 
-def tabu_search_route_aspiration_rule(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000):
+def tabu_search_route_aspiration_rule(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000, cache=None,
+                                      workers=1, seed=None, stats=None):
     t0 = time.time()
 
     if criterion not in ["time", "t", "change", "c"]:
         raise ValueError("wrong criterion")
     
+    cost_func = segment_cache(cost_func, criterion, cache)
+    cache_start = _cache_counters(cost_func)
+    rng = random.Random(seed) if seed is not None else random
     current_solution = stops[:]
-    random.shuffle(current_solution)
+    rng.shuffle(current_solution)
     
     best_cost, best_segments = calculate_route_cost(initial_time, start_stop, current_solution, graph, cost_func, criterion)
     best_solution = current_solution[:]
     tabu_list = set()
 
-    for it in range(iterations):
-        neighborhood = []
-        n = len(current_solution)
-
-        for i in range(n):
-            for j in range(i + 1, n):
-                neighbor = current_solution[:]
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                move = (i, j)
-                cost, segments = calculate_route_cost(initial_time, start_stop, neighbor, graph, cost_func, criterion)
-                
-                if move in tabu_list and cost >= best_cost:
-                    continue
-
-                neighborhood.append((cost, neighbor, segments, move))
+    steps = neighbors = 0
+
+    with neighborhood_pool(workers, start_stop, graph, cost_func, criterion) as pool:
+        for it in range(iterations):
+            n = len(current_solution)
+            moves = [(i, j) for i in range(n) for j in range(i + 1, n)]
+            neighborhood = evaluate_neighborhood(
+                initial_time, start_stop, current_solution, moves, tabu_list, graph, cost_func, criterion,
+                aspiration_cost=best_cost, pool=pool, workers=workers
+            )
+            neighbors += _evaluated(moves, tabu_list, best_cost)
         
-        if not neighborhood:
-            break
+            if not neighborhood:
+                break
+            steps += 1
         
-        neighborhood.sort(key=lambda x: x[0])
-        best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
-        current_solution = best_neighbor
-        tabu_list.add(best_move)
+            neighborhood.sort(key=lambda x: x[0])
+            best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
+            current_solution = best_neighbor
+            tabu_list.add(best_move)
         
-        if best_neighbor_cost < best_cost:
-            best_cost = best_neighbor_cost
-            best_solution = best_neighbor[:]
-            best_segments = best_neighbor_segments
+            if best_neighbor_cost < best_cost:
+                best_cost = best_neighbor_cost
+                best_solution = best_neighbor[:]
+                best_segments = best_neighbor_segments
+
+    if stats is not None:
+        _report_stats(stats, cost_func, cache_start, steps, neighbors)
 
     run_time = time.time() - t0 
     return best_cost, best_solution, best_segments, run_time
 
 
 
-def tabu_search_route_with_sampling(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000, sample_ratio=0.5):
+def tabu_search_route_with_sampling(start_stop, stops, initial_time, graph, cost_func, criterion, iterations=1000, sample_ratio=0.5, cache=None,
+                                   workers=1, seed=None, stats=None):
     t0 = time.time()
     
     if criterion not in ["time", "t", "change", "c"]:
         raise ValueError("wrong criterion")
     
+    cost_func = segment_cache(cost_func, criterion, cache)
+    cache_start = _cache_counters(cost_func)
+    rng = random.Random(seed) if seed is not None else random
     current_solution = stops[:]
-    random.shuffle(current_solution)
+    rng.shuffle(current_solution)
     
     best_cost, best_segments = calculate_route_cost(initial_time, start_stop, current_solution, graph, cost_func, criterion)
     best_solution = current_solution[:]
@@ -200,32 +434,32 @@ def tabu_search_route_with_sampling(start_stop, stops, initial_time, graph, cost
     all_moves = [(i, j) for i in range(n) for j in range(i+1, n)]
     sample_size = max(1, int(len(all_moves) * sample_ratio))
     
-    for it in range(iterations):
-        neighborhood = []
-        sampled_moves = random.sample(all_moves, sample_size)
-        
-        for move in sampled_moves:
-            i, j = move
-            neighbor = current_solution[:]
-            neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-            cost, segments = calculate_route_cost(initial_time, start_stop, neighbor, graph, cost_func, criterion)
-
-            if move in tabu_list and cost >= best_cost:
-                continue
-
-            neighborhood.append((cost, neighbor, segments, move))
+    steps = neighbors = 0
+
+    with neighborhood_pool(workers, start_stop, graph, cost_func, criterion) as pool:
+        for it in range(iterations):
+            sampled_moves = rng.sample(all_moves, sample_size)
+            neighborhood = evaluate_neighborhood(
+                initial_time, start_stop, current_solution, sampled_moves, tabu_list, graph, cost_func, criterion,
+                aspiration_cost=best_cost, pool=pool, workers=workers
+            )
+            neighbors += _evaluated(sampled_moves, tabu_list, best_cost)
         
-        if not neighborhood:
-            break
-
-        neighborhood.sort(key=lambda x: x[0])
-        best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
-        current_solution = best_neighbor
-        tabu_list.add(best_move)
-        if best_neighbor_cost < best_cost:
-            best_cost = best_neighbor_cost
-            best_solution = best_neighbor[:]
-            best_segments = best_neighbor_segments
+            if not neighborhood:
+                break
+            steps += 1
+
+            neighborhood.sort(key=lambda x: x[0])
+            best_neighbor_cost, best_neighbor, best_neighbor_segments, best_move = neighborhood[0]
+            current_solution = best_neighbor
+            tabu_list.add(best_move)
+            if best_neighbor_cost < best_cost:
+                best_cost = best_neighbor_cost
+                best_solution = best_neighbor[:]
+                best_segments = best_neighbor_segments
+
+    if stats is not None:
+        _report_stats(stats, cost_func, cache_start, steps, neighbors)
 
     run_time = time.time() - t0
     return best_cost, best_solution, best_segments, run_time
\ No newline at end of file
@@ -0,0 +1,197 @@
+from bisect import bisect_left
+from datetime import timedelta
+import numpy as np
+from src.Config.constants import BASE_DATE, MIN_CHANGE_SEC
+
+
+
+NO_LINE = -1
+NO_CONN = -1
+# line of a search state that just walked, boarding anything from it counts as a change
+WALK_LINE = -2
+
+
+
+def walk_code(footpath):
+    # walks share the label arrays with connections, stored below NO_CONN
+    return NO_CONN - 1 - footpath
+
+
+
+def is_walk(code):
+    return code < NO_CONN
+
+
+
+def rebuild_path(label_conn, label_parent, label):
+    path = []
+    while label_conn[label] != NO_CONN:
+        path.append(label_conn[label])
+        label = label_parent[label]
+    path.reverse()
+    return path
+
+
+
+class Timetable:
+    def __init__(self, compiled):
+        self.stops = list(compiled['stops'])
+        self.lines = list(compiled['lines'])
+        self.companies = list(compiled['companies'])
+        self.stop_index = {name: stop_id for stop_id, name in enumerate(self.stops)}
+        self.stop_lat = np.asarray(compiled['stop_lat'], dtype=np.float64)
+        self.stop_lon = np.asarray(compiled['stop_lon'], dtype=np.float64)
+        # (first, last) departure second loaded, None for the whole timetable
+        self.window = compiled.get('window')
+        # the cache's meta.json, e.g. meta['rejected'] counts the CSV rows dropped per reason; empty when not from a CSV
+        self.meta = compiled.get('meta', {})
+        self._stop_coords = None
+
+        # CSR layout: connections grouped by start stop, each group sorted by departure
+        order = np.lexsort((compiled['departure'], compiled['start_stop']))
+        self.departure = np.asarray(compiled['departure'][order], dtype=np.int32)
+        self.arrival = np.asarray(compiled['arrival'][order], dtype=np.int32)
+        self.start_stop = np.asarray(compiled['start_stop'][order], dtype=np.int32)
+        self.end_stop = np.asarray(compiled['end_stop'][order], dtype=np.int32)
+        self.line = np.asarray(compiled['line'][order], dtype=np.int32)
+        self.company = np.asarray(compiled['company'][order], dtype=np.int32)
+
+        counts = np.bincount(self.start_stop, minlength=len(self.stops))
+        self.offsets = np.zeros(len(self.stops) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+        # every departure is a multiple of this many seconds (60 for a whole-minute timetable)
+        self.time_resolution = int(np.gcd.reduce(self.departure)) if len(self.departure) else 1
+
+        # connections in the order the connection scan visits them
+        self.scan_order = np.lexsort((self.arrival, self.departure)).astype(np.int32)
+        self.scan_departure = self.departure[self.scan_order]
+
+        self._build_edges()
+
+
+    def _build_edges(self):
+        # an edge is every connection from one stop to the next on the same line,
+        # its connections are kept sorted by departure for bisecting
+        n = len(self.departure)
+        order = np.lexsort((self.departure, self.end_stop, self.line, self.start_stop))
+        start, line, end = self.start_stop[order], self.line[order], self.end_stop[order]
+
+        new_edge = np.ones(n, dtype=bool)
+        new_edge[1:] = (start[1:] != start[:-1]) | (line[1:] != line[:-1]) | (end[1:] != end[:-1])
+        edge_starts = np.flatnonzero(new_edge)
+
+        self.edge_line = line[edge_starts]
+        self.edge_end = end[edge_starts]
+        self.edge_conn_offsets = np.append(edge_starts, n).astype(np.int64)
+        self.edge_departure = self.departure[order]
+        self.edge_offsets = np.zeros(len(self.stops) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(start[edge_starts], minlength=len(self.stops)), out=self.edge_offsets[1:])
+
+        # edge_best[p] is the connection with the earliest arrival among positions p.. of its edge,
+        # so overtaking connections are handled without scanning
+        if n == 0:
+            self.edge_best = np.zeros(0, dtype=np.int32)
+            return
+        positions = np.arange(n, dtype=np.int64)
+        group = np.cumsum(new_edge) - 1
+        key = self.arrival[order].astype(np.int64) * n + positions
+        span = (int(self.arrival.max()) + 1) * n
+        suffix_min = np.minimum.accumulate((group * span + key)[::-1])[::-1]
+        self.edge_best = order[(suffix_min - group * span) % n].astype(np.int32)
+
+
+    def __len__(self):
+        return len(self.departure)
+
+
+    @property
+    def nbytes(self):
+        arrays = (self.departure, self.arrival, self.start_stop, self.end_stop, self.line, self.company,
+                  self.offsets, self.stop_lat, self.stop_lon, self.edge_line, self.edge_end,
+                  self.edge_conn_offsets, self.edge_departure, self.edge_offsets, self.edge_best,
+                  self.scan_order, self.scan_departure)
+        return sum(array.nbytes for array in arrays)
+
+
+    def stop_id(self, name):
+        return self.stop_index.get(name)
+
+
+    def stop_coords(self):
+        # name -> (lat, lon) as a_star_min_time takes it, built once per timetable
+        if self._stop_coords is None:
+            self._stop_coords = dict(zip(self.stops, zip(self.stop_lat.tolist(), self.stop_lon.tolist())))
+        return self._stop_coords
+
+
+    def to_seconds(self, moment):
+        return int((moment - BASE_DATE).total_seconds())
+
+
+    def start_seconds(self, start_time):
+        # seconds of a search's start time; a sliced timetable only holds the connections departing
+        # inside its window, so a search starting outside it would quietly miss every journey
+        seconds = self.to_seconds(start_time)
+        if self.window is not None and not self.window[0] <= seconds <= self.window[1]:
+            raise ValueError("start time outside the loaded timetable window")
+        return seconds
+
+
+    def to_datetime(self, seconds):
+        return BASE_DATE + timedelta(seconds=int(seconds))
+
+
+    def outgoing(self, stop_id):
+        return range(self.offsets[stop_id], self.offsets[stop_id + 1])
+
+
+    def earliest_departures(self, stop_id, current_time, current_line=NO_LINE):
+        edge_line, edge_conn_offsets, edge_departure, edge_best = (
+            self.edge_line, self.edge_conn_offsets, self.edge_departure, self.edge_best
+        )
+        for edge in range(self.edge_offsets[stop_id], self.edge_offsets[stop_id + 1]):
+            ready = current_time
+            if current_line != NO_LINE and edge_line[edge] != current_line:
+                ready += MIN_CHANGE_SEC
+
+            hi = edge_conn_offsets[edge + 1]
+            pos = bisect_left(edge_departure, ready, edge_conn_offsets[edge], hi)
+            if pos < hi:
+                yield edge_best[pos]
+
+
+    def missed_changes(self, stop_id, current_time, current_line=NO_LINE):
+        # edges of other lines with a departure that only MIN_CHANGE_TIME keeps current_line from catching
+        if current_line == NO_LINE:
+            return 0
+        missed = 0
+        for edge in range(self.edge_offsets[stop_id], self.edge_offsets[stop_id + 1]):
+            if self.edge_line[edge] == current_line:
+                continue
+            hi = self.edge_conn_offsets[edge + 1]
+            pos = bisect_left(self.edge_departure, current_time, self.edge_conn_offsets[edge], hi)
+            if pos < hi and self.edge_departure[pos] < current_time + MIN_CHANGE_SEC:
+                missed += 1
+        return missed
+
+
+    def connection(self, conn):
+        start_id = self.start_stop[conn]
+        end_id = self.end_stop[conn]
+        return {
+            'company': self.companies[self.company[conn]],
+            'line': self.lines[self.line[conn]],
+            'departure_time': self.to_datetime(self.departure[conn]),
+            'arrival_time': self.to_datetime(self.arrival[conn]),
+            'start_stop': self.stops[start_id],
+            'end_stop': self.stops[end_id],
+            'start_stop_lat': float(self.stop_lat[start_id]),
+            'start_stop_lon': float(self.stop_lon[start_id]),
+            'end_stop_lat': float(self.stop_lat[end_id]),
+            'end_stop_lon': float(self.stop_lon[end_id]),
+        }
+
+
+    def path(self, conns):
+        return [self.connection(conn) for conn in conns]
\ No newline at end of file
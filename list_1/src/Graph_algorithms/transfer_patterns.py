@@ -0,0 +1,297 @@
+import heapq, json, os, time
+from bisect import bisect_left
+from collections import deque
+import numpy as np
+from src.Config.constants import FILE_NAME, MIN_CHANGE_SEC, TIME_COST_PER_SEC
+from src.Graph_algorithms.graph_loader import load_compiled, cache_dir
+from src.Graph_algorithms.timetable import Timetable, NO_LINE, rebuild_path
+from src.Graph_algorithms.dijkstra import dijkstra_profile
+from src.Utilities.process_pool import fork_pool
+
+
+
+TRANSFER_PATTERN_VERSION = 1
+PATTERN_ARRAYS = ("ride_line", "ride_offsets", "ride_stops", "pair_source", "pair_target", "pair_offsets", "pair_rides")
+# sources handed to a worker at once
+PATTERN_CHUNK = 4
+# chunks queued per worker, finished ones wait for the parent only this long
+PATTERN_PREFETCH = 2
+
+
+
+def journey_rides(timetable, conns):
+    # a journey as rides (line, stops), a new ride starts wherever the line changes
+    rides = []
+    for conn in conns:
+        line, start, end = int(timetable.line[conn]), int(timetable.start_stop[conn]), int(timetable.end_stop[conn])
+        if rides and rides[-1][0] == line:
+            rides[-1][1].append(end)
+        else:
+            rides.append((line, [start, end]))
+    return [(line, tuple(stops)) for line, stops in rides]
+
+
+
+def source_patterns(timetable, source_id):
+    # target_id -> every ride of every Pareto-optimal journey from source_id over the whole day;
+    # together the rides of a pair are its transfer patterns, merged into one small graph
+    first, last = int(timetable.departure.min()), int(timetable.departure.max())
+    profiles, labels, _ = dijkstra_profile(
+        timetable, timetable.stops[source_id], timetable.to_datetime(first), timetable.to_datetime(last)
+    )
+    label_conn, label_parent = labels
+    patterns = {}
+    for target_id, profile in profiles.items():
+        rides = patterns.setdefault(target_id, set())
+        for _, _, label in profile:
+            rides.update(journey_rides(timetable, rebuild_path(label_conn, label_parent, label)))
+    return patterns
+
+
+
+_worker_timetable = None
+
+
+
+def _init_worker(timetable):
+    global _worker_timetable
+    _worker_timetable = timetable
+
+
+
+def _source_chunk(source_ids):
+    return [(source_id, source_patterns(_worker_timetable, source_id)) for source_id in source_ids]
+
+
+
+def compute_patterns(timetable, workers=None):
+    # yields (source_id, source_patterns) in source order, one profile search per source spread
+    # over the workers; only the chunks in flight are held, never the patterns of every source
+    workers = workers or os.cpu_count() or 1
+    sources = list(range(len(timetable.stops)))
+    chunks = [sources[k:k + PATTERN_CHUNK] for k in range(0, len(sources), PATTERN_CHUNK)]
+    _init_worker(timetable)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _source_chunk(chunk)
+        return
+
+    with fork_pool(workers, _init_worker, (timetable,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_source_chunk, chunk))
+            while len(pending) >= workers * PATTERN_PREFETCH:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+
+def _concatenate(parts, dtype):
+    return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+
+
+
+def pattern_arrays(results):
+    # every distinct ride stored once, each (source, target) pair lists the rides of its pattern graph;
+    # (source_id, patterns) are folded in as they come, so each source's sets are dropped straight
+    # away and only compact arrays pile up
+    ride_ids = {}
+    pair_source, pair_target, pair_counts, pair_rides = [], [], [], []
+    for source_id, patterns in results:
+        targets = sorted(patterns)
+        rides = [sorted(ride_ids.setdefault(ride, len(ride_ids)) for ride in patterns[target_id]) for target_id in targets]
+        pair_source.append(np.full(len(targets), source_id, dtype=np.int32))
+        pair_target.append(np.array(targets, dtype=np.int32))
+        pair_counts.append(np.array([len(pair) for pair in rides], dtype=np.int64))
+        pair_rides.append(np.array([ride for pair in rides for ride in pair], dtype=np.int32))
+
+    pair_offsets = np.zeros(sum(len(counts) for counts in pair_counts) + 1, dtype=np.int64)
+    np.cumsum(_concatenate(pair_counts, np.int64), out=pair_offsets[1:])
+    rides = list(ride_ids)
+    ride_offsets = np.zeros(len(rides) + 1, dtype=np.int64)
+    np.cumsum([len(stops) for _, stops in rides], out=ride_offsets[1:])
+    return {
+        'ride_line': np.array([line for line, _ in rides], dtype=np.int32),
+        'ride_offsets': ride_offsets,
+        'ride_stops': np.array([stop for _, stops in rides for stop in stops], dtype=np.int32),
+        'pair_source': _concatenate(pair_source, np.int32),
+        'pair_target': _concatenate(pair_target, np.int32),
+        'pair_offsets': pair_offsets,
+        'pair_rides': _concatenate(pair_rides, np.int32),
+    }
+
+
+
+def pattern_dir(file_name=FILE_NAME):
+    return os.path.join(cache_dir(file_name), "transfer_patterns")
+
+
+
+def build_transfer_patterns(file_name=FILE_NAME, workers=None):
+    t0 = time.time()
+    compiled = load_compiled(file_name)
+    timetable = Timetable(compiled)
+    arrays = pattern_arrays(compute_patterns(timetable, workers))
+
+    directory = pattern_dir(file_name)
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), values)
+
+    # meta.json last, as for the timetable cache; the patterns are tied to the timetable they came from
+    meta = {
+        'version': TRANSFER_PATTERN_VERSION,
+        'source_sha1': compiled['meta']['source_sha1'],
+        'pairs': len(arrays['pair_source']),
+        'rides': len(arrays['ride_line']),
+        'build_time': time.time() - t0,
+    }
+    tmp_path = os.path.join(directory, 'meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+    return TransferPatterns(timetable, arrays)
+
+
+
+def load_transfer_patterns(file_name=FILE_NAME, timetable=None, workers=None):
+    # patterns from disk, rebuilt when missing or made for another version of the timetable;
+    # timetable must be the full one, rides are looked up on its edges
+    compiled = load_compiled(file_name)
+    directory = pattern_dir(file_name)
+    meta_path = os.path.join(directory, 'meta.json')
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+
+    if meta is None or meta.get('version') != TRANSFER_PATTERN_VERSION or meta.get('source_sha1') != compiled['meta']['source_sha1']:
+        return build_transfer_patterns(file_name, workers)
+
+    arrays = {name: np.load(os.path.join(directory, name + '.npy')) for name in PATTERN_ARRAYS}
+    return TransferPatterns(timetable if timetable is not None else Timetable(compiled), arrays)
+
+
+
+class TransferPatterns:
+    # earliest-arrival queries answered on the pattern graph of the pair, each ride evaluated on the timetable
+    def __init__(self, timetable, arrays):
+        self.timetable = timetable
+        self.ride_line = arrays['ride_line'].tolist()
+        ride_offsets = arrays['ride_offsets']
+        ride_stops = arrays['ride_stops']
+        self.ride_start = ride_stops[ride_offsets[:-1]].tolist() if len(ride_stops) else []
+        self.ride_end = ride_stops[ride_offsets[1:] - 1].tolist() if len(ride_stops) else []
+        self.pair_offsets = arrays['pair_offsets'].tolist()
+        self.pair_rides = arrays['pair_rides'].tolist()
+        self.pairs = {
+            (source_id, target_id): k
+            for k, (source_id, target_id) in enumerate(zip(arrays['pair_source'].tolist(), arrays['pair_target'].tolist()))
+        }
+
+        # every hop of every ride mapped to its timetable edge, -1 where the timetable has no such edge;
+        # edges are sorted by (start, line, end), so their keys are sorted too
+        n_stops, n_lines = len(timetable.stops), max(len(timetable.lines), 1)
+        edge_start = np.repeat(np.arange(n_stops, dtype=np.int64), np.diff(timetable.edge_offsets))
+        edge_key = (edge_start * n_lines + timetable.edge_line) * n_stops + timetable.edge_end
+        hop = np.ones(len(ride_stops), dtype=bool)
+        hop[ride_offsets[1:] - 1] = False
+        hop_start = ride_stops[hop].astype(np.int64)
+        hop_end = ride_stops[np.flatnonzero(hop) + 1]
+        hop_line = np.repeat(arrays['ride_line'], np.diff(ride_offsets) - 1)
+        hop_key = (hop_start * n_lines + hop_line) * n_stops + hop_end
+        pos = np.minimum(np.searchsorted(edge_key, hop_key), max(len(edge_key) - 1, 0))
+        found = edge_key[pos] == hop_key if len(edge_key) else np.zeros(len(hop_key), dtype=bool)
+        hop_edge = np.where(found, pos, -1).tolist()
+        hop_offsets = (ride_offsets - np.arange(len(ride_offsets))).tolist()
+        self.ride_edges = [hop_edge[hop_offsets[r]:hop_offsets[r + 1]] for r in range(len(self.ride_line))]
+
+
+    def __len__(self):
+        return len(self.pairs)
+
+
+    def _ride(self, ride, ready):
+        # connections of the earliest ride boarded at ready or later, None when it cannot be made
+        timetable = self.timetable
+        edge_conn_offsets, edge_departure, edge_best = timetable.edge_conn_offsets, timetable.edge_departure, timetable.edge_best
+        conns = []
+        for edge in self.ride_edges[ride]:
+            if edge < 0:
+                return None
+            hi = edge_conn_offsets[edge + 1]
+            pos = bisect_left(edge_departure, ready, edge_conn_offsets[edge], hi)
+            if pos == hi:
+                return None
+            conn = int(edge_best[pos])
+            conns.append(conn)
+            ready = timetable.arrival[conn]
+        return conns
+
+
+    def query(self, start_stop, end_stop, start_time):
+        t0 = time.time()
+        timetable = self.timetable
+        start_id = timetable.stop_id(start_stop)
+        end_id = timetable.stop_id(end_stop)
+
+        if start_id is None or end_id is None:
+            run_time = time.time() - t0
+            return None, None, run_time
+
+        if start_id == end_id:
+            run_time = time.time() - t0
+            return 0, [], run_time
+
+        pair = self.pairs.get((start_id, end_id))
+        if pair is None:
+            run_time = time.time() - t0
+            return None, None, run_time
+
+        rides_at = {}
+        for ride in self.pair_rides[self.pair_offsets[pair]:self.pair_offsets[pair + 1]]:
+            rides_at.setdefault(self.ride_start[ride], []).append(ride)
+
+        # the pattern graph is tiny, so labels are kept per (stop, line) as in the full searches
+        start_sec = timetable.start_seconds(start_time)
+        label_conn = [()]
+        label_parent = [0]
+        best = {}
+        queue = [(start_sec, start_id, NO_LINE, 0)]
+
+        while queue:
+            current_time, current_stop, current_line, label = heapq.heappop(queue)
+
+            if current_stop == end_id:
+                conns = []
+                while label:
+                    conns[:0] = label_conn[label]
+                    label = label_parent[label]
+                run_time = time.time() - t0
+                return (current_time - start_sec) * TIME_COST_PER_SEC, timetable.path(conns), run_time
+
+            for ride in rides_at.get(current_stop, ()):
+                line = self.ride_line[ride]
+                ready = current_time if current_line in (NO_LINE, line) else current_time + MIN_CHANGE_SEC
+                conns = self._ride(ride, ready)
+                if conns is None:
+                    continue
+
+                new_time = int(timetable.arrival[conns[-1]])
+                state = (self.ride_end[ride], line)
+                if new_time >= best.get(state, float('inf')):
+                    continue
+
+                best[state] = new_time
+                label_conn.append(conns)
+                label_parent.append(label)
+                heapq.heappush(queue, (new_time, self.ride_end[ride], line, len(label_conn) - 1))
+
+        run_time = time.time() - t0
+        return None, None, run_time
+
+
+    def __call__(self, graph, from_stop, to_stop, departure_time):
+        return self.query(from_stop, to_stop, departure_time)
\ No newline at end of file
@@ -0,0 +1,389 @@
+import asyncio, json, os, time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import partial
+from urllib.parse import urlsplit, parse_qsl
+from src.Config.constants import BASE_DATE, TIME_COST_PER_SEC
+from src.Graph_algorithms.graph_loader import load_timetable
+from src.Graph_algorithms.dijkstra import dijkstra_min_time
+from src.Graph_algorithms.a_star import a_star_min_time, a_star_min_changes, a_star_min_changes_beam
+from src.Graph_algorithms.heuristics import HeuristicTable
+from src.Graph_algorithms.tabu_search import (
+    SegmentCache, tabu_search_route, tabu_search_route_dynamic_size, tabu_search_route_aspiration_rule, tabu_search_route_with_sampling
+)
+from src.Utilities.process_pool import fork_pool
+
+
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+RESULT_CACHE_SIZE = 4096
+RESULT_TTL = timedelta(minutes=10)
+# queries waiting for or running in the executor per worker, anything beyond is answered 503 at once
+SERVER_BACKLOG = 8
+MAX_BODY = 1 << 16
+# a request not answered by then gets 504, a tour still running is stopped at its next leg lookup
+REQUEST_TIMEOUT = timedelta(seconds=10)
+TOUR_ITERATIONS = 200
+MAX_TOUR_ITERATIONS = 1000
+MAX_TOUR_STOPS = 20
+
+
+
+def _a_star_time(timetable, start_stop, end_stop, start_time):
+    # the max_speed guess is not admissible, the table built when the server starts is
+    return a_star_min_time(
+        timetable, timetable.stop_coords(), start_stop, end_stop, start_time, heuristic_table=_worker_heuristic_table
+    )
+
+
+
+# algorithm -> (search, criterion)
+ROUTE_ALGORITHMS = {
+    'dijkstra': (dijkstra_min_time, "time"),
+    'a_star': (_a_star_time, "time"),
+    'a_star_changes': (a_star_min_changes, "change"),
+    'a_star_changes_beam': (a_star_min_changes_beam, "change"),
+}
+TOUR_VARIANTS = {
+    'tabu': tabu_search_route,
+    'tabu_dynamic_size': tabu_search_route_dynamic_size,
+    'tabu_aspiration_rule': tabu_search_route_aspiration_rule,
+    'tabu_with_sampling': tabu_search_route_with_sampling,
+}
+# leg search of the tours, per criterion, as in the report
+TOUR_COST_FUNCS = {"time": dijkstra_min_time, "change": a_star_min_changes}
+
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+
+class ResultCache:
+    # LRU of finished results, an entry older than ttl counts as a miss
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_TTL):
+        self.maxsize = maxsize
+        self.ttl_sec = ttl.total_seconds()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_sec:
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+
+def _leg_json(leg):
+    return dict(leg, departure_time=leg['departure_time'].strftime('%H:%M:%S'), arrival_time=leg['arrival_time'].strftime('%H:%M:%S'))
+
+
+
+def _cost_json(cost):
+    return None if cost is None or cost == float('inf') else float(cost)
+
+
+
+_worker_timetable = None
+_worker_heuristic_table = None
+
+
+
+def _init_worker(timetable, heuristic_table):
+    # under fork the timetable and heuristic table are inherited, not pickled, so they are built once for every worker
+    global _worker_timetable, _worker_heuristic_table
+    _worker_timetable = timetable
+    _worker_heuristic_table = heuristic_table
+
+
+
+def _run_route(algorithm, start_stop, end_stop, start_time):
+    search, _ = ROUTE_ALGORITHMS[algorithm]
+    cost, path, run_time = search(_worker_timetable, start_stop, end_stop, start_time)
+    return {'cost': _cost_json(cost), 'path': [_leg_json(leg) for leg in path] if path else None, 'run_time': run_time}
+
+
+
+def _run_tour(variant, criterion, start_stop, stops, start_time, iterations, deadline):
+    # a fixed seed makes a tour reproducible, so its result can be cached like a route
+    cache = SegmentCache(TOUR_COST_FUNCS[criterion], criterion, deadline=deadline)
+    cost, solution, segments, run_time = TOUR_VARIANTS[variant](
+        start_stop, stops, start_time, _worker_timetable, TOUR_COST_FUNCS[criterion], criterion,
+        iterations=iterations, cache=cache, seed=0
+    )
+    path = [leg for segment in segments or [] if segment[2] for leg in segment[2]]
+    return {'cost': _cost_json(cost), 'order': solution, 'path': [_leg_json(leg) for leg in path], 'run_time': run_time}
+
+
+
+def parse_time(value):
+    # 'HH:MM' or 'HH:MM:SS', hours past 24 run into the next day as in the timetable;
+    # minutes and seconds past 59 or negative fields are refused, as the timetable loader does
+    if not isinstance(value, str) or value.count(':') not in (1, 2):
+        raise RequestError(400, "bad time")
+    try:
+        fields = [int(field) for field in value.split(':')]
+    except ValueError:
+        raise RequestError(400, "bad time")
+    h, m, s = fields if len(fields) == 3 else fields + [0]
+    if h < 0 or not 0 <= m < 60 or not 0 <= s < 60:
+        raise RequestError(400, "bad time")
+    return BASE_DATE + timedelta(hours=h, minutes=m, seconds=s)
+
+
+
+class QueryServer:
+    def __init__(self, timetable=None, workers=None, cache_size=RESULT_CACHE_SIZE, ttl=RESULT_TTL, backlog=SERVER_BACKLOG,
+                 timeout=REQUEST_TIMEOUT):
+        self.timetable = timetable if timetable is not None else load_timetable()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = self.workers * backlog
+        self.timeout_sec = timeout.total_seconds()
+        self.pending = 0
+        self.cache = ResultCache(cache_size, ttl)
+        # key -> future of the query being computed, identical queries arriving meanwhile wait on it
+        self.in_flight = {}
+        self.coalesced = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # departures lie on whole minutes in most timetables, then every start in a minute shares one search
+        self.bucket_sec = 60 if self.timetable.time_resolution % 60 == 0 else 1
+
+        self.heuristic_table = HeuristicTable(self.timetable)
+        self.pool = fork_pool(self.workers, _init_worker, (self.timetable, self.heuristic_table))
+        # under fork every worker is started by the first submit; doing it here, before any socket is open,
+        # keeps the workers from holding copies of client connections that would then never close
+        self.pool.submit(int).result()
+
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+    def _bucket(self, start_time):
+        # no departure falls strictly inside a bucket, so searching from its end finds the same journeys
+        seconds = int((start_time - BASE_DATE).total_seconds())
+        return BASE_DATE + timedelta(seconds=-(-seconds // self.bucket_sec) * self.bucket_sec)
+
+
+    def _stop(self, name):
+        if not isinstance(name, str) or self.timetable.stop_id(name) is None:
+            raise RequestError(404, f"unknown stop: {name}")
+        return name
+
+
+    def _finished(self, key, future):
+        # bookkeeping follows the work itself, a request that timed out does not free its worker early
+        self.pending -= 1
+        del self.in_flight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+
+    async def _submit(self, key, func, *args):
+        result = self.cache.get(key)
+        if result is not None:
+            return result, 'cache'
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            source = 'coalesced'
+        elif self.pending >= self.max_pending:
+            self.rejected += 1
+            raise RequestError(503, "busy")
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, partial(func, *args))
+            self.in_flight[key] = future
+            self.pending += 1
+            future.add_done_callback(partial(self._finished, key))
+            source = 'search'
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout_sec), source
+        except (asyncio.TimeoutError, TimeoutError):
+            self.timed_out += 1
+            raise RequestError(504, "timeout")
+
+
+    async def route(self, params):
+        start_stop = self._stop(params.get('from'))
+        end_stop = self._stop(params.get('to'))
+        start_time = parse_time(params.get('time'))
+        criterion = params.get('criterion', "time")
+        if criterion not in ["time", "change"]:
+            raise RequestError(400, "wrong criterion")
+        algorithm = params.get('algorithm', 'dijkstra' if criterion == "time" else 'a_star_changes')
+        if algorithm not in ROUTE_ALGORITHMS or ROUTE_ALGORITHMS[algorithm][1] != criterion:
+            raise RequestError(400, "wrong algorithm")
+
+        bucket_time = self._bucket(start_time)
+        key = ('route', algorithm, start_stop, end_stop, bucket_time, criterion)
+        result, source = await self._submit(key, _run_route, algorithm, start_stop, end_stop, bucket_time)
+        if result['cost'] is not None and criterion == "time":
+            result = dict(result, cost=result['cost'] + (bucket_time - start_time).total_seconds() * TIME_COST_PER_SEC)
+        return dict(result, source=source)
+
+
+    async def tour(self, params):
+        start_stop = self._stop(params.get('from'))
+        stops = params.get('stops')
+        if not isinstance(stops, list) or not stops:
+            raise RequestError(400, "no stops")
+        if len(stops) > MAX_TOUR_STOPS:
+            raise RequestError(400, f"at most {MAX_TOUR_STOPS} stops")
+        stops = [self._stop(stop) for stop in stops]
+        start_time = parse_time(params.get('time'))
+        criterion = params.get('criterion', "time")
+        if criterion not in TOUR_COST_FUNCS:
+            raise RequestError(400, "wrong criterion")
+        variant = params.get('variant', 'tabu')
+        if variant not in TOUR_VARIANTS:
+            raise RequestError(400, "wrong variant")
+        try:
+            iterations = int(params.get('iterations', TOUR_ITERATIONS))
+        except (TypeError, ValueError):
+            raise RequestError(400, "bad iterations")
+        if not 1 <= iterations <= MAX_TOUR_ITERATIONS:
+            raise RequestError(400, f"iterations must be 1 to {MAX_TOUR_ITERATIONS}")
+
+        # the tour itself starts at start_time, only its legs are searched from buckets by the segment cache
+        key = ('tour', variant, start_stop, tuple(stops), start_time, criterion, iterations)
+        deadline = time.time() + self.timeout_sec
+        result, source = await self._submit(key, _run_tour, variant, criterion, start_stop, stops, start_time, iterations, deadline)
+        return dict(result, source=source)
+
+
+    def health(self):
+        return {
+            'stops': len(self.timetable.stops),
+            'connections': len(self.timetable),
+            'workers': self.workers,
+            'pending': self.pending,
+            'in_flight': len(self.in_flight),
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'cache': self.cache.info(),
+        }
+
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health' and method == 'GET':
+            return self.health()
+
+        handlers = {'/route': self.route, '/tour': self.tour}
+        if url.path not in handlers:
+            raise RequestError(404, "not found")
+        if method == 'GET':
+            params = dict(parse_qsl(url.query))
+            if 'stops' in params:
+                params['stops'] = params['stops'].split(',')
+        elif method == 'POST':
+            try:
+                params = json.loads(body or b'{}')
+            except ValueError:
+                raise RequestError(400, "bad json")
+            if not isinstance(params, dict):
+                raise RequestError(400, "bad json")
+        else:
+            raise RequestError(405, "method not allowed")
+        return await handlers[url.path](params)
+
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one JSON object per response
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY:
+                        raise RequestError(413, "body too large")
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except RequestError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError:
+                    status, payload = 400, {'error': "bad request"}
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and request_line.rstrip().endswith(b'HTTP/1.1')
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+
+HTTP_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout',
+}
+
+
+
+def run_server(host=SERVER_HOST, port=SERVER_PORT, **kwargs):
+    server = QueryServer(**kwargs)
+    try:
+        asyncio.run(server.serve(host, port))
+    finally:
+        server.close()
+
+
+
+if __name__ == '__main__':
+    run_server()
\ No newline at end of file
@@ -1,54 +1,95 @@
+import numpy as np
 import pandas as pd
-from src.Config.constants import TIME_COST_PER_SEC, CHANGE_COST_PER_CHANGE
+from functools import lru_cache
+from src.Config.constants import BASE_DATE, TIME_COST_PER_SEC, CHANGE_COST_PER_CHANGE
 
 
 
-def format_schedule_df(path, criterion, start_time=None):
-    pd.set_option('display.width', None)       
-    pd.set_option('display.max_columns', None)
+SCHEDULE_COLUMNS = ['line', 'departure_time', 'start_stop', 'arrival_time', 'end_stop', 'cost']
 
+
+
+@lru_cache(maxsize=1)
+def _clock_labels():
+    # 'HH:MM:SS' for every second of a day, formatting a column is then a single lookup
+    seconds = np.arange(24 * 3600)
+    return np.array([f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in zip(seconds // 3600, seconds // 60 % 60, seconds % 60)], dtype=object)
+
+
+
+def _clock(seconds):
+    return _clock_labels()[np.asarray(seconds, dtype=np.int64) % (24 * 3600)]
+
+
+
+def _to_seconds(times):
+    # datetimes (one or a list) to seconds since BASE_DATE
+    seconds = (np.asarray(times, dtype='datetime64[s]') - np.datetime64(BASE_DATE, 's')).astype(np.int64)
+    return int(seconds) if seconds.ndim == 0 else seconds
+
+
+
+def _costs(departure, arrival, line, first, start_sec, criterion):
+    # legs of any number of itineraries back to back, first marks the first leg of each
+    if criterion in ["time", "t"]:
+        previous = np.empty_like(arrival)
+        previous[1:] = arrival[:-1]
+        previous = np.where(first, start_sec, previous)
+        wait = np.maximum(departure - previous, 0)
+        return ((wait + arrival - departure) * TIME_COST_PER_SEC).astype(np.float64)
+
+    changed = np.ones(len(line), dtype=bool)
+    changed[1:] = line[1:] != line[:-1]
+    return np.where(changed & ~first, CHANGE_COST_PER_CHANGE, 0)
+
+
+
+def _path_columns(path, timetable=None):
+    # (line, departure, start_stop, arrival, end_stop) arrays from a path of leg dicts
+    # or, with a timetable, from the compact path of connection indices the searches build
+    if not len(path) or isinstance(path[0], dict):
+        return tuple(
+            _to_seconds([leg[key] for leg in path]) if key.endswith('_time') else np.array([leg[key] for leg in path], dtype=object)
+            for key in ('line', 'departure_time', 'start_stop', 'arrival_time', 'end_stop')
+        )
+
+    if timetable is None:
+        raise ValueError("no timetable")
+    conns = np.asarray(path, dtype=np.int64)
+    if (conns < 0).any():
+        raise ValueError("walk legs need the full path")
+    stops = np.asarray(timetable.stops, dtype=object)
+    return (
+        np.asarray(timetable.lines, dtype=object)[timetable.line[conns]], timetable.departure[conns].astype(np.int64),
+        stops[timetable.start_stop[conns]], timetable.arrival[conns].astype(np.int64), stops[timetable.end_stop[conns]],
+    )
+
+
+
+def _schedule_frame(columns, first, start_sec, criterion):
+    line, departure, start_stop, arrival, end_stop = columns
+    return pd.DataFrame({
+        'line': line,
+        'departure_time': _clock(departure),
+        'start_stop': start_stop,
+        'arrival_time': _clock(arrival),
+        'end_stop': end_stop,
+        'cost': _costs(departure, arrival, line, first, start_sec, criterion),
+    }, columns=SCHEDULE_COLUMNS)
+
+
+
+def format_schedule_df(path, criterion, start_time=None, timetable=None):
     if criterion not in ["time", "t", "change", "c"]:
         raise ValueError("wrong criterion")
-    
-    df = pd.DataFrame(path)
-    
-    if criterion in ["time", "t"]:
-        if start_time is None:
-            raise ValueError("no start_time")
-            
-        costs = []
-        for i, row in df.iterrows():
-            if i == 0:
-                wait = (row['departure_time'] - start_time).total_seconds()
-                if wait < 0:
-                    wait = 0
-                travel = (row['arrival_time'] - row['departure_time']).total_seconds()
-                cost = (wait + travel) * TIME_COST_PER_SEC
-            else:
-                prev_arrival = df.iloc[i-1]['arrival_time']
-                wait = (row['departure_time'] - prev_arrival).total_seconds()
-                if wait < 0:
-                    wait = 0
-                travel = (row['arrival_time'] - row['departure_time']).total_seconds()
-                cost = (wait + travel) * TIME_COST_PER_SEC
-            costs.append(cost)
-
-        df['cost'] = costs
-    
-    elif criterion in ["change", "c"]:
-        costs = [0]
-        for i in range(1, len(df)):
-            if df.iloc[i]['line'] != df.iloc[i-1]['line']:
-                costs.append(CHANGE_COST_PER_CHANGE)
-            else:
-                costs.append(0)
-        df['cost'] = costs
-
-    df['departure_time'] = df['departure_time'].dt.strftime('%H:%M:%S')
-    df['arrival_time'] = df['arrival_time'].dt.strftime('%H:%M:%S')
-    df = df[['line', 'departure_time', 'start_stop', 'arrival_time', 'end_stop', 'cost']]
-    
-    return df
+    if criterion in ["time", "t"] and start_time is None:
+        raise ValueError("no start_time")
+
+    columns = _path_columns(path, timetable)
+    first = np.zeros(len(columns[0]), dtype=bool)
+    first[:1] = True
+    start_sec = _to_seconds(start_time) if start_time is not None else 0
+    return _schedule_frame(columns, first, start_sec, criterion)
 
 
 
@@ -60,3 +101,42 @@ def format_tabu_route_df(best_segments, criterion, start_time):
 
     df_route = format_schedule_df(full_path, criterion, start_time)
     return df_route
+
+
+
+def format_schedules_df(results, criterion, timetable=None):
+    # one frame for many itineraries, results as route_batch yields them: ((start_stop, end_stop, start_time), cost, path);
+    # queries without a route are left out, the itinerary column keeps their position
+    if criterion not in ["time", "t", "change", "c"]:
+        raise ValueError("wrong criterion")
+
+    parts, itinerary, start_sec = [], [], []
+    for index, ((_, _, start_time), cost, path) in enumerate(results):
+        if not path:
+            continue
+        parts.append(_path_columns(path, timetable))
+        itinerary.append(np.full(len(parts[-1][0]), index, dtype=np.int64))
+        start_sec.append(_to_seconds(start_time))
+
+    if not parts:
+        return pd.DataFrame(columns=['itinerary'] + SCHEDULE_COLUMNS)
+
+    columns = tuple(np.concatenate(column) for column in zip(*parts))
+    itinerary = np.concatenate(itinerary)
+    first = np.ones(len(itinerary), dtype=bool)
+    first[1:] = itinerary[1:] != itinerary[:-1]
+    lengths = [len(part[0]) for part in parts]
+    df = _schedule_frame(columns, first, np.repeat(start_sec, lengths), criterion)
+    df.insert(0, 'itinerary', itinerary)
+    return df
+
+
+
+def export_schedules(results, file_name, criterion, timetable=None):
+    # .parquet needs pyarrow or fastparquet installed, anything else is written as CSV
+    df = format_schedules_df(results, criterion, timetable)
+    if str(file_name).endswith('.parquet'):
+        df.to_parquet(file_name, index=False)
+    else:
+        df.to_csv(file_name, index=False)
+    return len(df)
\ No newline at end of file
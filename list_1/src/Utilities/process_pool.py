@@ -0,0 +1,11 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+
+def fork_pool(workers, initializer, initargs):
+    # under fork the initargs are inherited by every worker rather than pickled,
+    # platforms without fork fall back to their default start method
+    methods = multiprocessing.get_all_start_methods()
+    mp_context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=initializer, initargs=initargs)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import json, time
+
+
+
+class SearchStats:
+    # pass as stats=... to any search or tabu variant; every search it is handed to adds its counters,
+    # max_ counters keep the largest value seen and non-numeric values keep the last one
+    def __init__(self):
+        self.counters = {}
+        self.searches = 0
+
+
+    def update(self, counters=(), **more):
+        # same signature as dict.update, so searches treat a SearchStats and a plain dict alike
+        self.searches += 1
+        for key, value in dict(counters, **more).items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                self.counters[key] = value
+            elif key.startswith('max_'):
+                self.counters[key] = max(self.counters.get(key, value), value)
+            else:
+                self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def __getitem__(self, key):
+        return self.counters[key]
+
+
+    def __contains__(self, key):
+        return key in self.counters
+
+
+    def get(self, key, default=None):
+        return self.counters.get(key, default)
+
+
+    def as_dict(self):
+        return dict(self.counters, searches=self.searches)
+
+
+    def clear(self):
+        self.counters.clear()
+        self.searches = 0
+
+
+    def to_json(self, **labels):
+        # one JSON line, ready to append to a metrics log
+        return json.dumps(dict(self.as_dict(), timestamp=time.time(), **labels), ensure_ascii=False, default=str)
+
+
+    def to_prometheus(self, prefix='routing', **labels):
+        # Prometheus text exposition, numeric counters only
+        label_text = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        label_text = '{' + label_text + '}' if label_text else ''
+        lines = []
+        for key, value in sorted(self.as_dict().items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            kind = 'gauge' if key.startswith('max_') else 'counter'
+            lines.append(f"# TYPE {prefix}_{key} {kind}")
+            lines.append(f"{prefix}_{key}{label_text} {value}")
+        return '\n'.join(lines) + '\n'
\ No newline at end of file
@@ -0,0 +1,32 @@
+import pytest
+from datetime import timedelta
+from src.Benchmarks.synthetic import synthetic_timetable
+from src.Benchmarks.searches import random_queries
+from src.Graph_algorithms.csa import csa_min_time
+
+
+
+# small enough for a whole-day transfer pattern build to take a few seconds
+QUERY_COUNT = 150
+
+
+
+@pytest.fixture(scope="session")
+def timetable():
+    return synthetic_timetable(
+        stops=100, lines=12, stops_per_line=12, headway=timedelta(minutes=15),
+        first_departure=timedelta(hours=6), last_departure=timedelta(hours=10), seed=3
+    )
+
+
+
+@pytest.fixture(scope="session")
+def queries(timetable):
+    return random_queries(timetable, QUERY_COUNT, seed=1, first_hour=6, last_hour=9)
+
+
+
+@pytest.fixture(scope="session")
+def expected(timetable, queries):
+    # csa_min_time is the reference every other router is checked against
+    return [csa_min_time(timetable, *query) for query in queries]
\ No newline at end of file
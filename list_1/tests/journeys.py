@@ -0,0 +1,17 @@
+from src.Config.constants import MIN_CHANGE_SEC
+
+
+
+def check_path(path, start_stop, end_stop, start_time):
+    assert path[0]['start_stop'] == start_stop and path[-1]['end_stop'] == end_stop
+    assert path[0]['departure_time'] >= start_time
+    for leg, next_leg in zip(path, path[1:]):
+        assert leg['end_stop'] == next_leg['start_stop']
+        assert next_leg['departure_time'] >= leg['arrival_time']
+        if leg['line'] != next_leg['line']:
+            assert (next_leg['departure_time'] - leg['arrival_time']).total_seconds() >= MIN_CHANGE_SEC
+
+
+
+def changes(path):
+    return sum(leg['line'] != next_leg['line'] for leg, next_leg in zip(path, path[1:]))
\ No newline at end of file
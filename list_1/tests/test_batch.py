@@ -0,0 +1,25 @@
+import pytest
+from src.Graph_algorithms.a_star import a_star_min_changes
+from src.Graph_algorithms.batch import route_batch
+
+
+
+@pytest.mark.parametrize("algorithm", ['csa', 'dijkstra', 'a_star'])
+def test_route_batch_matches_csa(timetable, queries, expected, algorithm):
+    found = {query: cost for query, cost, _ in route_batch(queries, algorithm, timetable=timetable)}
+    assert len(found) == len(set(queries))
+    for query, (cost, _, _) in zip(queries, expected):
+        assert found[query] == cost, query
+
+
+
+def test_route_batch_raptor_changes(timetable, queries):
+    found = {query: cost for query, cost, _ in route_batch(queries[:50], 'raptor_changes', timetable=timetable)}
+    for query in queries[:50]:
+        assert found[query] == a_star_min_changes(timetable, *query)[0], query
+
+
+
+def test_route_batch_rejects_unknown_algorithm(timetable, queries):
+    with pytest.raises(ValueError):
+        route_batch(queries, 'nope', timetable=timetable)
\ No newline at end of file
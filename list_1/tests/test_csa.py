@@ -0,0 +1,20 @@
+from src.Graph_algorithms.dijkstra import dijkstra_min_time
+from tests.journeys import check_path
+
+
+
+def test_csa_paths(queries, expected):
+    assert any(cost is not None for cost, _, _ in expected)
+    for (start_stop, end_stop, start_time), (cost, path, _) in zip(queries, expected):
+        if cost is not None:
+            check_path(path, start_stop, end_stop, start_time)
+            assert (path[-1]['arrival_time'] - start_time).total_seconds() == cost
+
+
+
+def test_dijkstra_matches_csa(timetable, queries, expected):
+    for query, (cost, _, _) in zip(queries, expected):
+        found, path, _ = dijkstra_min_time(timetable, *query)
+        assert found == cost, query
+        if path:
+            check_path(path, *query)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import csv, os
+import numpy as np
+import pytest
+from datetime import timedelta
+from src.Config.constants import BASE_DATE
+from src.Benchmarks.synthetic import synthetic_compiled
+from src.Benchmarks.searches import random_queries
+from src.Graph_algorithms import graph_loader
+from src.Graph_algorithms.graph_loader import CSV_COLUMNS, load_compiled, load_timetable, parse_seconds_array, slice_compiled
+from src.Graph_algorithms.timetable import Timetable
+from src.Graph_algorithms.csa import csa_min_time
+from src.Graph_algorithms.dijkstra import dijkstra_min_time, dijkstra_one_to_all
+from src.Graph_algorithms.a_star import a_star_min_changes
+from src.Graph_algorithms.raptor import raptor_min_time
+
+
+
+WINDOW = (timedelta(hours=8), timedelta(hours=10))
+A = ('Stop A', '51.1', '17.0')
+B = ('Stop B', '51.2', '17.1')
+
+
+
+def write_csv(path, rows):
+    # rows of (company, line, departure, arrival, start, end), start and end as (name, lat, lon)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('',) + CSV_COLUMNS)
+        for index, (company, line, departure, arrival, start, end) in enumerate(rows):
+            writer.writerow((index, company, line, departure, arrival, start[0], end[0]) + start[1:] + end[1:])
+
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    return synthetic_compiled(stops=100, lines=12, stops_per_line=12, seed=3)
+
+
+
+@pytest.fixture(scope="module")
+def sliced(compiled):
+    return Timetable(slice_compiled(compiled, *(int(bound.total_seconds()) for bound in WINDOW)))
+
+
+
+def test_sliced_timetable_matches_full_inside_window(compiled, sliced):
+    full = Timetable(compiled)
+    last = BASE_DATE + WINDOW[1]
+    for query in random_queries(sliced, 50, seed=2, first_hour=8, last_hour=8):
+        cost, path, _ = csa_min_time(full, *query)
+        # journeys arriving by the end of the window only use connections inside it
+        if path and path[-1]['arrival_time'] <= last:
+            assert dijkstra_min_time(sliced, *query)[0] == cost, query
+            assert csa_min_time(sliced, *query)[0] == cost, query
+
+
+
+@pytest.mark.parametrize("hour", [7, 14])
+@pytest.mark.parametrize("search", [csa_min_time, dijkstra_min_time, a_star_min_changes, raptor_min_time])
+def test_searches_refuse_start_outside_window(sliced, search, hour):
+    start_stop, end_stop = sliced.stops[:2]
+    with pytest.raises(ValueError):
+        search(sliced, start_stop, end_stop, BASE_DATE + timedelta(hours=hour))
+
+
+
+def test_one_to_all_refuses_start_outside_window(sliced):
+    with pytest.raises(ValueError):
+        dijkstra_one_to_all(sliced, sliced.stops[0], BASE_DATE + timedelta(hours=14))
+
+
+
+def test_parse_seconds_array():
+    times = ['08:05:00', '8:05:00', '24:30:00', '27:00:01', '100:00:00', '08:60:00', '08:00:60', '-1:00:00',
+             'ab:cd:ef', '08:05', '', None]
+    seconds = parse_seconds_array(times)
+    assert seconds[:5].tolist() == [29100, 29100, 88200, 97201, 360000]
+    assert np.isnan(seconds[5:]).all()
+
+
+
+def test_compile_rejects_bad_rows(tmp_path):
+    path = str(tmp_path / 'graph.csv')
+    write_csv(path, [
+        ('MPK', '1', '08:00:00', '08:05:00', A, B),
+        ('MPK', '1', '24:10:00', '24:15:00', A, B),
+        ('MPK', '1', '08:61:00', '08:65:00', A, B),
+        ('MPK', '1', '08:00:00', 'soon', A, B),
+        ('MPK', '1', '08:00:00', '08:05:00', A, ('Stop C', '91.0', '17.1')),
+        ('MPK', '1', '08:00:00', '08:05:00', ('Stop D', '51.1', 'east'), B),
+        ('MPK', '', '08:00:00', '08:05:00', A, B),
+        ('MPK', '1', '08:00:00', '08:05:00', ('', '51.1', '17.0'), B),
+    ])
+    timetable = load_timetable(path)
+
+    assert timetable.meta['rejected'] == {'time': 2, 'coordinates': 2, 'missing_name': 2}
+    assert timetable.meta['rejected_rows'] == 6 and timetable.meta['connections'] == 2
+    assert timetable.stops == ['Stop A', 'Stop B']
+    # times past midnight run into the next day
+    assert sorted(timetable.departure.tolist()) == [8 * 3600, 24 * 3600 + 600]
+
+
+
+def test_cache_is_reused_or_recompiled(tmp_path, monkeypatch):
+    path = str(tmp_path / 'graph.csv')
+    write_csv(path, [('MPK', '1', '08:00:00', '08:05:00', A, B), ('MPK', '1', '08:10:00', '08:15:00', B, A)])
+    compiles = []
+    compile_timetable = graph_loader.compile_timetable
+
+    def counted_compile(file_name):
+        compiles.append(file_name)
+        return compile_timetable(file_name)
+
+    monkeypatch.setattr(graph_loader, 'compile_timetable', counted_compile)
+
+    def arrivals():
+        return load_compiled(path)['arrival'].tolist()
+
+    def set_mtime(seconds):
+        os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+    assert arrivals() == [8 * 3600 + 300, 8 * 3600 + 900] and len(compiles) == 1
+    assert arrivals() and len(compiles) == 1
+
+    # touched: the content hash still matches, so the cache is kept and its mtime updated
+    set_mtime(1000)
+    assert arrivals() and len(compiles) == 1
+    assert graph_loader.cache_is_fresh(path)
+
+    # edited in place, same size and a new mtime
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text.replace('08:05:00', '08:06:00'))
+    set_mtime(2000)
+    assert arrivals() == [8 * 3600 + 360, 8 * 3600 + 900] and len(compiles) == 2
+
+    # truncated to one row, with the mtime put back
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text[:text.index('\n1,')])
+    set_mtime(2000)
+    assert arrivals() == [8 * 3600 + 300] and len(compiles) == 3
+
+    # a cache written by another version is never trusted
+    monkeypatch.setattr(graph_loader, 'CACHE_VERSION', graph_loader.CACHE_VERSION + 1)
+    assert not graph_loader.cache_is_fresh(path)
+    assert arrivals() == [8 * 3600 + 300] and len(compiles) == 4
+    assert arrivals() and len(compiles) == 4
\ No newline at end of file
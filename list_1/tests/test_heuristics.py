@@ -0,0 +1,11 @@
+from src.Graph_algorithms.a_star import a_star_min_time
+from src.Graph_algorithms.heuristics import HeuristicTable
+
+
+
+def test_a_star_matches_csa(timetable, queries, expected):
+    heuristic_table = HeuristicTable(timetable)
+    stop_coords = timetable.stop_coords()
+    for query, (cost, _, _) in zip(queries, expected):
+        found, _, _ = a_star_min_time(timetable, stop_coords, *query, heuristic_table=heuristic_table)
+        assert found == cost, query
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio, json, time
+import pytest
+from datetime import timedelta
+from src.Server.query_server import QueryServer, RequestError, parse_time, MAX_TOUR_STOPS, MAX_TOUR_ITERATIONS
+
+
+
+@pytest.fixture(scope="module")
+def server(timetable):
+    server = QueryServer(timetable=timetable, workers=1)
+    yield server
+    server.close()
+
+
+
+async def _request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nConnection: close\r\nContent-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+
+
+def send(server, *requests):
+    # every request is sent at once, so identical ones overlap in the server
+    async def run():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            return await asyncio.gather(*[_request(port, *request) for request in requests])
+    return asyncio.run(run())
+
+
+
+@pytest.mark.parametrize("value", ["25:61", "08:60", "08:00:60", "-1:00", "08:-5", "8h", "08", "", None])
+def test_parse_time_rejects_bad_times(value):
+    with pytest.raises(RequestError) as error:
+        parse_time(value)
+    assert error.value.status == 400
+
+
+
+def test_parse_time_runs_past_midnight():
+    assert parse_time("25:30") - parse_time("00:00") == timedelta(hours=25, minutes=30)
+    assert parse_time("08:00:30") - parse_time("08:00") == timedelta(seconds=30)
+
+
+
+def test_health(server, timetable):
+    [(status, payload)] = send(server, ('GET', '/health'))
+    assert status == 200
+    assert payload['stops'] == len(timetable.stops) and payload['connections'] == len(timetable)
+    assert payload['workers'] == 1 and payload['pending'] == 0
+
+
+
+def test_not_found_and_bad_requests(server, timetable):
+    a, b = timetable.stops[:2]
+    responses = send(
+        server,
+        ('GET', '/nowhere'),
+        ('POST', '/route', {'from': 'nowhere', 'to': b, 'time': '08:00'}),
+        ('POST', '/route', {'from': a, 'to': b, 'time': '25:61'}),
+        ('POST', '/route', {'from': a, 'to': b, 'time': '08:00', 'criterion': 'fun'}),
+        ('POST', '/route', {'from': a, 'to': b, 'time': '08:00', 'algorithm': 'a_star_changes'}),
+        ('PUT', '/route'),
+    )
+    assert [status for status, _ in responses] == [404, 404, 400, 400, 400, 405]
+    assert all('error' in payload for _, payload in responses)
+
+
+
+def test_tour_caps(server, timetable):
+    start, stops = timetable.stops[0], timetable.stops[1:MAX_TOUR_STOPS + 2]
+    responses = send(
+        server,
+        ('POST', '/tour', {'from': start, 'stops': stops, 'time': '08:00'}),
+        ('POST', '/tour', {'from': start, 'stops': stops[:3], 'time': '08:00', 'iterations': MAX_TOUR_ITERATIONS + 1}),
+        ('POST', '/tour', {'from': start, 'stops': stops[:3], 'time': '08:00', 'iterations': 0}),
+        ('POST', '/tour', {'from': start, 'stops': [], 'time': '08:00'}),
+    )
+    assert [status for status, _ in responses] == [400, 400, 400, 400]
+
+
+
+def test_identical_queries_are_coalesced_then_cached(server, timetable, expected, queries):
+    start_stop, end_stop, start_time = next(query for query, (cost, _, _) in zip(queries, expected) if cost is not None)
+    body = {'from': start_stop, 'to': end_stop, 'time': start_time.strftime('%H:%M')}
+    coalesced = server.coalesced
+
+    responses = send(server, *[('POST', '/route', body)] * 4)
+    assert [status for status, _ in responses] == [200] * 4
+    assert sorted(payload['source'] for _, payload in responses) == ['coalesced'] * 3 + ['search']
+    assert len({payload['cost'] for _, payload in responses}) == 1
+    assert server.coalesced == coalesced + 3
+
+    [(status, payload)] = send(server, ('POST', '/route', body))
+    assert status == 200 and payload['source'] == 'cache'
+
+
+
+def test_deadline(timetable):
+    server = QueryServer(timetable=timetable, workers=1, timeout=timedelta(milliseconds=50))
+    body = {'from': timetable.stops[0], 'stops': timetable.stops[1:MAX_TOUR_STOPS + 1], 'time': '07:00',
+            'iterations': MAX_TOUR_ITERATIONS}
+
+    async def run():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        async with listener:
+            started = time.time()
+            status, _ = await _request(listener.sockets[0].getsockname()[1], 'POST', '/tour', body)
+            answered = time.time() - started
+            # the tour stops at its next leg lookup past the deadline, which frees the worker
+            while server.pending and time.time() - started < 10:
+                await asyncio.sleep(0.01)
+            return status, answered, time.time() - started
+
+    try:
+        status, answered, freed = asyncio.run(run())
+        assert status == 504 and server.timed_out == 1 and answered < 1
+        assert server.pending == 0 and freed < 5
+    finally:
+        server.close()
\ No newline at end of file
@@ -0,0 +1,21 @@
+from src.Config.constants import CHANGE_COST_PER_CHANGE
+from src.Graph_algorithms.a_star import a_star_min_changes
+from src.Graph_algorithms.raptor import raptor_pareto
+from tests.journeys import check_path, changes
+
+
+
+def test_raptor_pareto_matches_csa_and_a_star_changes(timetable, queries, expected):
+    for query, (cost, _, _) in zip(queries, expected):
+        journeys, _ = raptor_pareto(timetable, *query)
+        assert (journeys[-1][0] if journeys else None) == cost, query
+
+        fewest, _, _ = a_star_min_changes(timetable, *query)
+        assert (journeys[0][1] * CHANGE_COST_PER_CHANGE if journeys else None) == fewest, query
+
+        # strictly fewer changes for strictly more time along the front
+        for (cost_a, changes_a, _), (cost_b, changes_b, _) in zip(journeys, journeys[1:]):
+            assert changes_a < changes_b and cost_a > cost_b
+        for _, journey_changes, path in journeys:
+            check_path(path, *query)
+            assert changes(path) <= journey_changes
\ No newline at end of file
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from datetime import timedelta
+from src.Config.constants import BASE_DATE
+from src.Graph_algorithms.dijkstra import dijkstra_min_time
+from src.Graph_algorithms.tabu_search import (
+    SegmentCache, calculate_route_cost, calculate_route_states, evaluate_swap, tabu_search_route, tabu_search_route_dynamic_size,
+    tabu_search_route_aspiration_rule, tabu_search_route_with_sampling
+)
+
+
+
+START_TIME = BASE_DATE + timedelta(hours=6, minutes=30)
+
+
+
+@pytest.fixture(scope="module")
+def tour_stops(timetable):
+    # stops with departures, spread over the grid, so the tour has a feasible order
+    served = [timetable.stops[stop] for stop in np.unique(timetable.start_stop)]
+    return served[0], served[9:54:9]
+
+
+
+def test_segment_cache_matches_uncached_legs(timetable):
+    cache = SegmentCache(dijkstra_min_time, "time", maxsize=4)
+    start_stop, end_stop = timetable.stops[3], timetable.stops[40]
+    for seconds in (0, 20, 59, 60, 61):
+        departure_time = START_TIME + timedelta(seconds=seconds)
+        cost, path, _ = cache(timetable, start_stop, end_stop, departure_time)
+        expected, expected_path, _ = dijkstra_min_time(timetable, start_stop, end_stop, departure_time)
+        assert cost == expected and path == expected_path
+    # 20, 59 and 60 share the 06:31 bucket, 0 and 61 have their own
+    assert cache.info() == {'hits': 2, 'misses': 3, 'size': 3, 'maxsize': 4}
+
+    for stop in timetable.stops[41:44]:
+        cache(timetable, start_stop, stop, START_TIME)
+    assert cache.info()['size'] == 4
+    cache(timetable, start_stop, end_stop, START_TIME)
+    assert cache.info()['misses'] == 7
+
+
+
+def test_segment_cache_deadline(timetable):
+    cache = SegmentCache(dijkstra_min_time, "time", deadline=0)
+    with pytest.raises(TimeoutError):
+        cache(timetable, timetable.stops[0], timetable.stops[1], START_TIME)
+
+
+
+def test_cached_tour_matches_uncached(timetable, tour_stops):
+    start_stop, stops = tour_stops
+    cached = tabu_search_route(start_stop, stops, START_TIME, timetable, dijkstra_min_time, "time", iterations=10, seed=1)
+    cache = SegmentCache(dijkstra_min_time, "time", maxsize=0)
+    uncached = tabu_search_route(start_stop, stops, START_TIME, timetable, dijkstra_min_time, "time", iterations=10, cache=cache, seed=1)
+    assert cached[0] < float('inf')
+    assert cached[:3] == uncached[:3]
+
+
+
+@pytest.mark.parametrize("criterion", ["time", "change"])
+def test_evaluate_swap_matches_full_evaluation(timetable, tour_stops, criterion):
+    start_stop, stops = tour_stops
+    cost_func = SegmentCache(dijkstra_min_time, criterion)
+    _, segments, states = calculate_route_states(START_TIME, start_stop, stops, timetable, cost_func, criterion)
+
+    for i in range(len(stops)):
+        for j in range(i + 1, len(stops)):
+            neighbor = stops[:]
+            neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+            cost, swap_segments = evaluate_swap(start_stop, neighbor, i, states, segments, timetable, cost_func, criterion)
+            assert (cost, swap_segments) == calculate_route_cost(START_TIME, start_stop, neighbor, timetable, cost_func, criterion)
+
+            # a bound below the real cost cuts the tail search short
+            if cost < float('inf'):
+                assert evaluate_swap(start_stop, neighbor, i, states, segments, timetable, cost_func, criterion, cost - 1) == (float('inf'), None)
+
+
+
+@pytest.mark.parametrize("variant", [
+    tabu_search_route, tabu_search_route_dynamic_size, tabu_search_route_aspiration_rule, tabu_search_route_with_sampling
+])
+def test_pool_matches_serial(timetable, tour_stops, variant):
+    start_stop, stops = tour_stops
+    serial = variant(start_stop, stops, START_TIME, timetable, dijkstra_min_time, "time", iterations=10, seed=2)
+    pooled = variant(start_stop, stops, START_TIME, timetable, dijkstra_min_time, "time", iterations=10, workers=2, seed=2)
+    assert serial[0] < float('inf')
+    assert pooled[:3] == serial[:3]
\ No newline at end of file
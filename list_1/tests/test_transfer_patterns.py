@@ -0,0 +1,12 @@
+from src.Graph_algorithms.transfer_patterns import TransferPatterns, compute_patterns, pattern_arrays
+from tests.journeys import check_path
+
+
+
+def test_transfer_patterns_match_csa(timetable, queries, expected):
+    patterns = TransferPatterns(timetable, pattern_arrays(compute_patterns(timetable, workers=1)))
+    for query, (cost, _, _) in zip(queries, expected):
+        found, path, _ = patterns.query(*query)
+        assert found == cost, query
+        if path:
+            check_path(path, *query)
\ No newline at end of file